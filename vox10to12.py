@@ -1,74 +1,153 @@
-import sys
-
-def convert_value(field_value):
-    field_value_original = field_value
-
-    if 0 < field_value_original < 63:
-        field_value = 129 - field_value
-
-    scaled_value = (field_value * 32) / 127
-
-    numerator = round(scaled_value)
-
-    closest_fraction = numerator / 32
-
-    if 0 < field_value_original < 63:
-        closest_fraction = 1 - closest_fraction
-
-    return closest_fraction
-
-def process_file(file_path):
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    in_format_version = False
-    in_track1 = False
-    in_track8 = False
-    format_version = None
-
-    processed_lines = []
-
-    for line in lines:
-        if line.strip() == '#FORMAT VERSION':
-            in_format_version = True
-        elif line.strip() == '#TRACK1':
-            in_track1 = True
-        elif line.strip() == '#TRACK8':
-            in_track8 = True
-        elif line.strip() == '#END':
-            in_format_version = False
-            in_track1 = False
-            in_track8 = False
-
-        if in_format_version:
-            if line.strip().isdigit():
-                format_version = int(line.strip())
-                if format_version == 10:
-                    line = '12\n'
-        elif in_track1 or in_track8:
-            parts = line.split('\t')
-            if len(parts) > 1 and parts[1].replace('.', '', 1).isdigit():
-                field_value = int(parts[1])
-                parts[1] = f"{convert_value(field_value):.6f}"
-                print(parts)
-                parts[-1] = parts[-1].strip()
-                parts.append('0')
-                parts.append('0\n')
-                line = '\t'.join(parts)
-
-        processed_lines.append(line)
-
-    new_file_path = file_path.replace('.vox', '_processed.vox')
-    with open(new_file_path, 'w') as file:
-        file.writelines(processed_lines)
-
-    return new_file_path
-
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <file_path>")
-        sys.exit(1)
-
-    file_path = sys.argv[1]
-    processed_file_path = process_file(file_path)
-    print(f"Processed file saved as: {processed_file_path}")
\ No newline at end of file
+import argparse
+import contextlib
+import functools
+import sys
+
+from voxfiles import atomic_open, expand_paths, map_batch, output_path_for, same_file
+import voxprofile
+
+def convert_value(field_value):
+    field_value_original = field_value
+
+    if 0 < field_value_original < 63:
+        field_value = 129 - field_value
+
+    scaled_value = (field_value * 32) / 127
+
+    numerator = round(scaled_value)
+
+    closest_fraction = numerator / 32
+
+    if 0 < field_value_original < 63:
+        closest_fraction = 1 - closest_fraction
+
+    return closest_fraction
+
+# v10 laser positions are integers 0-127; their v12 values are precomputed and already formatted
+LASER_VALUES = {str(field_value): f"{convert_value(field_value):.6f}" for field_value in range(128)}
+
+def laser_value(field):
+    value = LASER_VALUES.get(field)
+    if value is None:
+        value = f"{convert_value(int(field)):.6f}"
+    return value
+
+def convert_format_version(line, stripped, verbose=False):
+    if stripped == '10':
+        return '12\n'
+    return line
+
+def convert_laser_row(line, stripped, verbose=False):
+    # Positions become 0-1 values and every row gains two flag columns
+    parts = line.split('\t')
+    if len(parts) > 1 and parts[1].replace('.', '', 1).isdigit():
+        parts[1] = laser_value(parts[1])
+        if verbose:
+            print(parts, file=sys.stderr)
+        parts[-1] = parts[-1].strip()
+        parts.append('0')
+        parts.append('0\n')
+        line = '\t'.join(parts)
+    return line
+
+# Sections whose rows change between v10 and v12. These are the only rows the original converter rewrote, and the
+# only v12 rows the tools in this repo read besides BEAT INFO.
+SECTION_HANDLERS = {
+    '#FORMAT VERSION': convert_format_version,
+    '#TRACK1': convert_laser_row,
+    '#TRACK8': convert_laser_row,
+}
+
+# Sections checked and copied as they are. BEAT INFO is parsed by voxtimebase with one row layout for both
+# versions; the others are not read by any tool here and are copied verbatim, as the original converter did. No v12
+# reference chart ships with the repo, so --verbose names any other section that is copied without being listed.
+COPIED_SECTIONS = frozenset([
+    '#BEAT INFO', '#BPM INFO', '#TILT MODE INFO', '#LYRIC INFO', '#END POSITION', '#TAB EFFECT INFO',
+    '#FXBUTTON EFFECT INFO', '#TAB PARAM ASSIGN INFO', '#REVERB EFFECT PARAM', '#TRACK2', '#TRACK3', '#TRACK4',
+    '#TRACK5', '#TRACK6', '#TRACK7', '#TRACK AUTO TAB', '#SPCONTROLER', '#END',
+])
+
+def convert_lines(lines, verbose=False):
+    handler = None
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            handler = SECTION_HANDLERS.get(stripped)
+            if verbose and handler is None and stripped not in COPIED_SECTIONS:
+                print(f"unchecked section copied as is: {stripped}", file=sys.stderr)
+        elif handler is not None:
+            line = handler(line, stripped, verbose)
+        yield line
+
+def process_file(file_path, output_path=None, verbose=False, atomic=False):
+    if output_path is None:
+        output_path = '-' if file_path == '-' else output_path_for(file_path, '_processed')
+    # The input is still being read while the output is written, so converting in place has to go through a
+    # temporary file
+    atomic = atomic or same_file(file_path, output_path)
+
+    # Reading, converting and writing are streamed together, so they are timed as one stage
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(voxprofile.stage('convert'))
+        if file_path == '-':
+            source = sys.stdin
+        else:
+            source = stack.enter_context(open(file_path, 'r'))
+
+        if output_path == '-':
+            sys.stdout.writelines(convert_lines(source, verbose))
+            sys.stdout.flush()
+            return output_path
+
+        if not atomic:
+            with open(output_path, 'w') as file:
+                file.writelines(convert_lines(source, verbose))
+            return output_path
+
+        with atomic_open(output_path) as file:
+            file.writelines(convert_lines(source, verbose))
+
+    return output_path
+
+def convert_one(file_path, verbose=False, atomic=False):
+    try:
+        return file_path, process_file(file_path, verbose=verbose, atomic=atomic), None
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}"
+
+def process_batch(file_paths, workers=None, verbose=False, atomic=False):
+    return map_batch(functools.partial(convert_one, verbose=verbose, atomic=atomic), file_paths, workers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert vox 10 charts to vox 12.')
+    parser.add_argument('paths', nargs='+', help='Chart files, directories or glob patterns to convert.')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of worker processes (default: CPU count).')
+    parser.add_argument('-o', '--output', help='Output path for a single input, "-" for stdout.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print every converted laser row to stderr.')
+    parser.add_argument('--atomic', action='store_true', help='Write to a temporary file and rename it into place.')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+
+    if args.paths == ['-'] or args.output is not None:
+        if len(args.paths) != 1:
+            parser.error("--output can only be used with a single input")
+        process_file(args.paths[0], args.output, args.verbose, args.atomic)
+        sys.exit(0)
+
+    file_paths = expand_paths(args.paths)
+    if not file_paths:
+        print("Error: No .vox files found.")
+        sys.exit(1)
+
+    failed = 0
+    for file_path, processed_file_path, error in process_batch(file_paths, args.workers, args.verbose, args.atomic):
+        if error is None:
+            print(f"OK      {file_path} -> {processed_file_path}")
+        else:
+            failed += 1
+            print(f"FAILED  {file_path}: {error}")
+
+    print(f"{len(file_paths) - failed} converted, {failed} failed")
+    if failed:
+        sys.exit(1)
@@ -1,278 +1,556 @@
-import numpy as np
-import re
-import sys
-from scipy.interpolate import CubicSpline, CubicHermiteSpline
-
-def parse_ticks(tick_string, beats_per_measure, ticks_per_beat):
-    measure, beat, tick = map(int, re.findall(r'\d+', tick_string))
-    total_ticks = (measure - 1) * beats_per_measure * ticks_per_beat + (beat - 1) * ticks_per_beat + tick
-    return total_ticks
-
-def parse_line(line):
-    parts = line.split('\t')
-    tick_string = parts[0]
-    value = float(parts[1])
-    extra_values = parts[2:]
-    return tick_string, value, extra_values
-
-def bezier_point(t, p0, p1, p2):
-    return (1 - t)**2 * p0 + 2 * (1 - t) * t * p1 + t**2 * p2
-
-def ease_in_cubic(t):
-    return t**3
-
-def ease_out_cubic(t):
-    return 1 - (1 - t)**3
-
-def ease_in_quint(t):
-    return t**5
-
-def ease_out_quint(t):
-    return 1 - (1 - t)**5
-
-def ease_in_circ(t):
-    return 1 - np.sqrt(1 - t**2)
-
-def ease_out_circ(t):
-    return np.sqrt(1 - (t - 1)**2)
-
-def ease_in_quad(t):
-    return t**2
-
-def ease_out_quad(t):
-    return 1 - (1 - t)**2
-
-def ease_in_quart(t):
-    return t**4
-
-def ease_out_quart(t):
-    return 1 - (1 - t)**4
-
-def ease_in_expo(t):
-    return 2**(10 * (t - 1)) if t > 0 else 0
-
-def ease_out_expo(t):
-    return 1 - 2**(-10 * t)
-
-def ease_in_elastic(t):
-    c4 = (2 * np.pi) / 3
-    return np.power(2, 10 * t - 10) * np.sin((t * 10 - 10.75) * c4) if t > 0 else 0
-
-def ease_out_elastic(t):
-    c4 = (2 * np.pi) / 3
-    return 1 - np.power(2, -10 * t) * np.sin((t * 10 - 0.75) * c4)
-
-def ease_in_back(t):
-    c1 = 1.70158
-    c3 = c1 + 1
-    return c3 * t * t * t - c1 * t * t
-
-def ease_out_back(t):
-    c1 = 1.70158
-    c3 = c1 + 1
-    return 1 + c3 * np.power(t - 1, 3) + c1 * np.power(t - 1, 2)
-
-def ease_in_bounce(t):
-    return 1 - ease_out_bounce(1 - t)
-
-def ease_out_bounce(t):
-    n1 = 7.5625
-    d1 = 2.75
-    if t < 1 / d1:
-        return n1 * t * t
-    elif t < 2 / d1:
-        t -= 1.5 / d1
-        return n1 * t * t + 0.75
-    elif t < 2.5 / d1:
-        t -= 2.25 / d1
-        return n1 * t * t + 0.9375
-    else:
-        t -= 2.625 / d1
-        return n1 * t * t + 0.984375
-    
-def interpolate(points, interpolation_type):
-    interpolated_points = []
-
-    if interpolation_type == 'cubic_spline':
-        if len(points) < 3:
-            print("Error: Cubic spline requires at least 3 points.")
-            sys.exit(1)
-
-        x = np.array([point[0] for point in points])
-        y = np.array([point[1] for point in points])
-
-        cs = CubicSpline(x, y, bc_type='natural')
-
-        for tick in range(int(x[0]), int(x[-1]) + 1, 3):
-            value = cs(tick)
-            interpolated_points.append((tick, value))
-
-    elif interpolation_type == 'cubic_hermite':
-        if len(points) < 3 or any(point[2] is None for point in points):
-            print("Error: Cubic Hermite spline requires at least 3 points with dydx values.")
-            sys.exit(1)
-
-        min_tick = min(point[0] for point in points)
-        max_tick = max(point[0] for point in points)
-        max_num_points = (max_tick - min_tick) // 3 + 1
-        normalized_ticks = [(point[0] - min_tick) / (max_tick - min_tick) for point in points]
-
-        x = np.array(normalized_ticks)
-        y = np.array([point[1] for point in points])
-        dydx = np.array([point[2] for point in points])
-
-        chs = CubicHermiteSpline(x, y, dydx)
-
-        normalized_x_dense = np.linspace(0, 1, max_num_points)
-
-        evenly_spaced_ticks = [min_tick + i * 3 for i in range(max_num_points)]
-
-        max_num_points = len(evenly_spaced_ticks)
-        normalized_x_dense = np.linspace(0, 1, max_num_points)
-
-        for i, norm_x_val in enumerate(normalized_x_dense):
-            original_tick = evenly_spaced_ticks[i]
-            value = chs(norm_x_val)
-            interpolated_points.append((original_tick, value))
-
-    else:
-        start_tick, start_val, dydx = points[0]
-        end_tick, end_val, dydx = points[-1]
-        total_ticks = end_tick - start_tick
-        
-        for tick in range(start_tick, end_tick + 1, 3):
-            ratio = (tick - start_tick) / total_ticks
-            value = None
-            if interpolation_type == 'ease_out_sin':
-                value = start_val + (end_val - start_val) * np.sin(ratio * np.pi / 2)
-            elif interpolation_type == 'ease_in_sin':
-                value = start_val + (end_val - start_val) * (1 - np.cos(ratio * np.pi / 2))
-            elif interpolation_type == 'sharp':
-                value = start_val + (end_val - start_val) * ratio
-            elif interpolation_type == 'ease_in_bezier':
-                control_point = start_val
-                value = bezier_point(ratio, start_val, control_point, end_val)
-            elif interpolation_type == 'ease_in_bezier':
-                control_point = end_val
-                value = bezier_point(ratio, start_val, control_point, end_val)
-            elif interpolation_type == 'ease_in_cubic':
-                value = start_val + (end_val - start_val) * ease_in_cubic(ratio)
-            elif interpolation_type == 'ease_out_cubic':
-                value = start_val + (end_val - start_val) * ease_out_cubic(ratio)
-            elif interpolation_type == 'ease_in_quint':
-                value = start_val + (end_val - start_val) * ease_in_quint(ratio)
-            elif interpolation_type == 'ease_out_quint':
-                value = start_val + (end_val - start_val) * ease_out_quint(ratio)
-            elif interpolation_type == 'ease_in_circ':
-                value = start_val + (end_val - start_val) * ease_in_circ(ratio)
-            elif interpolation_type == 'ease_out_circ':
-                value = start_val + (end_val - start_val) * ease_out_circ(ratio)
-            elif interpolation_type == 'ease_in_quad':
-                value = start_val + (end_val - start_val) * ease_in_quad(ratio)
-            elif interpolation_type == 'ease_out_quad':
-                value = start_val + (end_val - start_val) * ease_out_quad(ratio)
-            elif interpolation_type == 'ease_in_quart':
-                value = start_val + (end_val - start_val) * ease_in_quart(ratio)
-            elif interpolation_type == 'ease_out_quart':
-                value = start_val + (end_val - start_val) * ease_out_quart(ratio)
-            elif interpolation_type == 'ease_in_expo':
-                value = start_val + (end_val - start_val) * ease_in_expo(ratio)
-            elif interpolation_type == 'ease_out_expo':
-                value = start_val + (end_val - start_val) * ease_out_expo(ratio)
-            elif interpolation_type == 'ease_in_elastic':
-                value = start_val + (end_val - start_val) * ease_in_elastic(ratio)
-            elif interpolation_type == 'ease_out_elastic':
-                value = start_val + (end_val - start_val) * ease_out_elastic(ratio)
-            elif interpolation_type == 'ease_in_back':
-                value = start_val + (end_val - start_val) * ease_in_back(ratio)
-            elif interpolation_type == 'ease_out_back':
-                value = start_val + (end_val - start_val) * ease_out_back(ratio)
-            elif interpolation_type == 'ease_in_bounce':
-                value = start_val + (end_val - start_val) * ease_in_bounce(ratio)
-            elif interpolation_type == 'ease_out_bounce':
-                value = start_val + (end_val - start_val) * ease_out_bounce(ratio)
-            interpolated_points.append((tick, value))
-
-    return interpolated_points
-
-def process_file(file_path, interpolation_type, time_signature):
-    beats_per_measure, denominator = map(int, time_signature.split('/'))
-    ticks_per_beat = int((4 / denominator) * 48)
-
-    ticks_per_measure = beats_per_measure * ticks_per_beat
-
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    points = []
-    extra_values_list = []
-    for line in lines:
-        tick_string, value, extra_values = parse_line(line)
-        total_ticks = parse_ticks(tick_string, beats_per_measure, ticks_per_beat)
-
-        dydx = float(extra_values[7]) if len(extra_values) > 7 else None
-        points.append((total_ticks, value, dydx))
-
-        if interpolation_type == 'cubic_hermite':
-            adjusted_index_6_value = '2'
-        elif interpolation_type == 'sharp':
-            adjusted_index_6_value = '3'
-        elif interpolation_type == 'ease_out_sin':
-            adjusted_index_6_value = '4'
-        elif interpolation_type == 'ease_in_sin':
-            adjusted_index_6_value = '5'
-        else:
-            adjusted_index_6_value = '1'
-
-        #put wrongindex number lol
-        adjusted_extra_values = extra_values[:5] + [adjusted_index_6_value] + extra_values[6:]
-
-        extra_values_list.append(adjusted_extra_values[:7])
-
-    if len(points) < 2:
-        print("Error: Not enough lines for processing.")
-        sys.exit(1)
-
-    interpolated_points = interpolate(points, interpolation_type)
-
-    output_lines = []
-
-    for index, (tick, value) in enumerate(interpolated_points):
-        measure = tick // ticks_per_measure + 1
-        beat = (tick % ticks_per_measure) // ticks_per_beat + 1
-        sub_beat = tick % ticks_per_beat
-
-        if index == 0:
-            extra_values_str = '\t'.join(extra_values_list[0]).strip()
-        elif index == len(interpolated_points) - 1:
-            extra_values_str = '\t'.join(extra_values_list[-1]).strip()
-        else:
-            adjusted_extra_values = ['0'] + extra_values_list[0][1:]
-            extra_values_str = '\t'.join(adjusted_extra_values).strip()
-
-        output_lines.append(f"{measure:03},{beat:02},{sub_beat:02}\t{value:.6f}\t{extra_values_str}\n")
-
-    with open(file_path, 'w') as file:
-        file.writelines(output_lines)
-
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python script.py <input_file> <interpolation_type> <time_signature>")
-        sys.exit(1)
-
-    input_file = sys.argv[1]
-    interpolation_type = sys.argv[2].lower()
-    time_signature = sys.argv[3]
-
-    if interpolation_type not in [
-        'ease_in_sin', 'ease_out_sin', 'sharp',
-        'ease_in_cubic', 'ease_out_cubic', 'ease_in_quint', 'ease_out_quint',
-        'ease_in_circ', 'ease_out_circ', 'ease_in_quad', 'ease_out_quad',
-        'ease_in_quart', 'ease_out_quart', 'ease_in_expo', 'ease_out_expo',
-        'ease_in_elastic', 'ease_out_elastic', 'ease_in_back', 'ease_out_back',
-        'ease_in_bounce', 'ease_out_bounce', 'cubic_spline', 'cubic_hermite'
-    ]:
-        print("Error: Interpolation type not recognized.")
-        sys.exit(1)
-
-    process_file(input_file, interpolation_type, time_signature)
\ No newline at end of file
+import argparse
+import json
+import numpy as np
+import os
+import sys
+from scipy.interpolate import CubicSpline, CubicHermiteSpline
+
+from voxcache import CurveCache
+from voxdoc import VoxDocument
+from voxerrors import VoxError
+from voxfiles import output_path_for
+from voxtimebase import Timebase
+import voxprofile
+import voxresample
+
+def parse_line(line):
+    parts = line.split('\t')
+    tick_string = parts[0]
+    value = float(parts[1])
+    extra_values = parts[2:]
+    return tick_string, value, extra_values
+
+def bezier_point(t, p0, p1, p2):
+    return (1 - t)**2 * p0 + 2 * (1 - t) * t * p1 + t**2 * p2
+
+def ease_linear(t):
+    return t
+
+def ease_in_sin(t):
+    return 1 - np.cos(t * np.pi / 2)
+
+def ease_out_sin(t):
+    return np.sin(t * np.pi / 2)
+
+def ease_in_cubic(t):
+    return t**3
+
+def ease_out_cubic(t):
+    return 1 - (1 - t)**3
+
+def ease_in_quint(t):
+    return t**5
+
+def ease_out_quint(t):
+    return 1 - (1 - t)**5
+
+def ease_in_circ(t):
+    return 1 - np.sqrt(1 - t**2)
+
+def ease_out_circ(t):
+    return np.sqrt(1 - (t - 1)**2)
+
+def ease_in_quad(t):
+    return t**2
+
+def ease_out_quad(t):
+    return 1 - (1 - t)**2
+
+def ease_in_quart(t):
+    return t**4
+
+def ease_out_quart(t):
+    return 1 - (1 - t)**4
+
+def ease_in_expo(t):
+    t = np.asarray(t, dtype=float)
+    return np.where(t > 0, 2**(10 * (t - 1)), 0.0)
+
+def ease_out_expo(t):
+    return 1 - 2**(-10 * t)
+
+def ease_in_elastic(t):
+    c4 = (2 * np.pi) / 3
+    t = np.asarray(t, dtype=float)
+    return np.where(t > 0, np.power(2, 10 * t - 10) * np.sin((t * 10 - 10.75) * c4), 0.0)
+
+def ease_out_elastic(t):
+    c4 = (2 * np.pi) / 3
+    return 1 - np.power(2, -10 * t) * np.sin((t * 10 - 0.75) * c4)
+
+def ease_in_back(t):
+    c1 = 1.70158
+    c3 = c1 + 1
+    return c3 * t * t * t - c1 * t * t
+
+def ease_out_back(t):
+    c1 = 1.70158
+    c3 = c1 + 1
+    return 1 + c3 * np.power(t - 1, 3) + c1 * np.power(t - 1, 2)
+
+def ease_in_bounce(t):
+    return 1 - ease_out_bounce(1 - t)
+
+def ease_out_bounce(t):
+    n1 = 7.5625
+    d1 = 2.75
+    t = np.asarray(t, dtype=float)
+    conditions = [t < 1 / d1, t < 2 / d1, t < 2.5 / d1]
+    t = t - np.select(conditions, [0.0, 1.5 / d1, 2.25 / d1], 2.625 / d1)
+    return n1 * t * t + np.select(conditions, [0.0, 0.75, 0.9375], 0.984375)
+
+EASING_FUNCTIONS = {
+    'ease_in_sin': ease_in_sin,
+    'ease_out_sin': ease_out_sin,
+    'sharp': ease_linear,
+    'ease_in_cubic': ease_in_cubic,
+    'ease_out_cubic': ease_out_cubic,
+    'ease_in_quint': ease_in_quint,
+    'ease_out_quint': ease_out_quint,
+    'ease_in_circ': ease_in_circ,
+    'ease_out_circ': ease_out_circ,
+    'ease_in_quad': ease_in_quad,
+    'ease_out_quad': ease_out_quad,
+    'ease_in_quart': ease_in_quart,
+    'ease_out_quart': ease_out_quart,
+    'ease_in_expo': ease_in_expo,
+    'ease_out_expo': ease_out_expo,
+    'ease_in_elastic': ease_in_elastic,
+    'ease_out_elastic': ease_out_elastic,
+    'ease_in_back': ease_in_back,
+    'ease_out_back': ease_out_back,
+    'ease_in_bounce': ease_in_bounce,
+    'ease_out_bounce': ease_out_bounce,
+}
+
+BEZIER_TYPES = ('ease_in_bezier', 'ease_out_bezier')
+
+SPLINE_TYPES = ('cubic_spline', 'cubic_hermite')
+
+INTERPOLATION_TYPES = list(EASING_FUNCTIONS) + list(BEZIER_TYPES) + list(SPLINE_TYPES)
+
+# Fitted spline curves are cached on disk when VOX_CACHE_DIR is set or --cache-dir is given
+CURVE_CACHE = CurveCache.from_env()
+
+def ease_values(ratio, start_val, end_val, interpolation_type):
+    if interpolation_type in BEZIER_TYPES:
+        control_point = start_val if interpolation_type == 'ease_in_bezier' else end_val
+        return bezier_point(ratio, start_val, control_point, end_val)
+    return start_val + (end_val - start_val) * EASING_FUNCTIONS[interpolation_type](ratio)
+
+def interpolate_segment(start_tick, start_val, end_tick, end_val, interpolation_type, step=3):
+    ticks = np.arange(start_tick, end_tick + 1, step)
+    ratio = (ticks - start_tick) / (end_tick - start_tick)
+    return ticks, ease_values(ratio, start_val, end_val, interpolation_type)
+
+def evaluate_segments(start_ticks, start_values, end_ticks, end_values, interpolation_types, step=3):
+    start_ticks = np.asarray(start_ticks, dtype=np.int64)
+    end_ticks = np.asarray(end_ticks, dtype=np.int64)
+    start_values = np.asarray(start_values, dtype=float)
+    end_values = np.asarray(end_values, dtype=float)
+    interpolation_types = np.asarray(interpolation_types, dtype=object)
+
+    # Every segment covers [start, end) on its own grid; the end tick belongs to the next segment
+    counts = (end_ticks - start_ticks - 1) // step + 1
+    segment_ids = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ticks = start_ticks[segment_ids] + offsets * step
+    ratio = (ticks - start_ticks[segment_ids]) / (end_ticks - start_ticks)[segment_ids]
+
+    values = np.empty(len(ticks))
+    for interpolation_type in set(interpolation_types.tolist()):
+        mask = (interpolation_types == interpolation_type)[segment_ids]
+        ids = segment_ids[mask]
+        values[mask] = ease_values(ratio[mask], start_values[ids], end_values[ids], interpolation_type)
+
+    return ticks, values, segment_ids
+
+def interpolate(points, interpolation_type, cache=None, step=3):
+    cache = CURVE_CACHE if cache is None else cache
+    if not cache or interpolation_type not in SPLINE_TYPES:
+        return compute_curve(points, interpolation_type, step)
+
+    key = cache.key(points, interpolation_type, step)
+    cached = cache.get(key)
+    if cached is not None:
+        return list(zip(*(column.tolist() for column in cached)))
+
+    interpolated_points = compute_curve(points, interpolation_type, step)
+    cache.put(key, [tick for tick, _ in interpolated_points], [value for _, value in interpolated_points])
+    return interpolated_points
+
+def compute_curve(points, interpolation_type, step=3):
+    if interpolation_type in SPLINE_TYPES:
+        x = np.array([point[0] for point in points], dtype=np.int64)
+        y = np.array([point[1] for point in points], dtype=float)
+
+        if interpolation_type == 'cubic_spline':
+            if len(points) < 3:
+                raise VoxError("Cubic spline requires at least 3 points.")
+            with voxprofile.stage('fit'):
+                spline = CubicSpline(x, y, bc_type='natural')
+        else:
+            # With a dy/dx at every point even a single segment is well defined
+            if len(points) < 2 or any(point[2] is None for point in points):
+                raise VoxError("Cubic Hermite spline requires at least 2 points with dydx values.")
+            # dy/dx is per tick, so the spline is fitted on the real ticks and needs no normalization
+            with voxprofile.stage('fit'):
+                spline = CubicHermiteSpline(x, y, np.array([point[2] for point in points], dtype=float))
+
+        # Both splines are evaluated on the exact tick grid in one call
+        ticks = np.arange(x[0], x[-1] + 1, step)
+        with voxprofile.stage('evaluate'):
+            values = spline(ticks)
+        return list(zip(ticks.tolist(), values.tolist()))
+
+    if interpolation_type in EASING_FUNCTIONS or interpolation_type in BEZIER_TYPES:
+        start_tick, start_val, dydx = points[0]
+        end_tick, end_val, dydx = points[-1]
+
+        with voxprofile.stage('evaluate'):
+            ticks, values = interpolate_segment(start_tick, start_val, end_tick, end_val, interpolation_type, step)
+        return list(zip(ticks.tolist(), values.tolist()))
+
+    raise VoxError("Interpolation type not recognized.")
+
+def check_interpolation_type(interpolation_type, allow_keep=False):
+    if interpolation_type not in INTERPOLATION_TYPES and not (allow_keep and interpolation_type == 'keep'):
+        raise VoxError(f"Interpolation type not recognized: {interpolation_type}")
+
+def curve_type_flag(interpolation_type):
+    if interpolation_type == 'cubic_hermite':
+        return '2'
+    elif interpolation_type == 'sharp':
+        return '3'
+    elif interpolation_type == 'ease_out_sin':
+        return '4'
+    elif interpolation_type == 'ease_in_sin':
+        return '5'
+    return '1'
+
+def adjust_extra_values(extra_values, interpolation_type):
+    #put wrongindex number lol
+    adjusted_extra_values = extra_values[:5] + [curve_type_flag(interpolation_type)] + extra_values[6:]
+    return adjusted_extra_values[:7]
+
+def dydx_from_results(results, timebase):
+    # voxfinddydx reports dy/dx over its [min_tick, max_tick] span normalized to [0, 1]; other point lists are per tick
+    span = results['max_tick'] - results['min_tick'] if 'min_tick' in results and 'max_tick' in results else 1
+    return {timebase.parse(point['mbt']): float(point['dydx']) / (span or 1) for point in results['points']}
+
+def load_dydx(file_path, timebase):
+    with (sys.stdin if file_path == '-' else open(file_path, 'r')) as file:
+        return dydx_from_results(json.load(file), timebase)
+
+def prepare_points(rows, interpolation_type, dydx_by_tick=None):
+    points = []
+    extra_values_list = []
+    for total_ticks, value, extra_values in rows:
+        dydx = float(extra_values[7]) if len(extra_values) > 7 else None
+        if dydx_by_tick and total_ticks in dydx_by_tick:
+            dydx = dydx_by_tick[total_ticks]
+        points.append((total_ticks, value, dydx))
+        extra_values_list.append(adjust_extra_values(extra_values, interpolation_type))
+
+    return points, extra_values_list
+
+def build_curve(points, extra_values_list, interpolation_type, tolerance=None, step=3, cache=None):
+    if len(points) < 2:
+        raise VoxError("Not enough lines for processing.")
+
+    interpolated_points = interpolate(points, interpolation_type, cache, step)
+    if tolerance is not None:
+        with voxprofile.stage('resample'):
+            keep = voxresample.simplify_mask([tick for tick, _ in interpolated_points],
+                                             [value for _, value in interpolated_points], tolerance)
+            interpolated_points = [point for point, kept in zip(interpolated_points, keep.tolist()) if kept]
+
+    rows = []
+    for index, (tick, value) in enumerate(interpolated_points):
+        if index == 0:
+            extra_values = extra_values_list[0]
+        elif index == len(interpolated_points) - 1:
+            extra_values = extra_values_list[-1]
+        else:
+            extra_values = ['0'] + extra_values_list[0][1:]
+        rows.append((tick, value, extra_values))
+
+    return rows
+
+def process_lines(lines, interpolation_type, timebase, dydx_by_tick=None, tolerance=None, step=3, cache=None):
+    with voxprofile.stage('parse'):
+        rows = []
+        for line in lines:
+            tick_string, value, extra_values = parse_line(line)
+            rows.append((timebase.parse(tick_string), value, extra_values))
+
+        points, extra_values_list = prepare_points(rows, interpolation_type, dydx_by_tick)
+
+    curve = build_curve(points, extra_values_list, interpolation_type, tolerance, step, cache)
+
+    with voxprofile.stage('format'):
+        output_lines = []
+        for tick, value, extra_values in curve:
+            extra_values_str = '\t'.join(extra_values).strip()
+            output_lines.append(f"{timebase.format(tick)}\t{value:.6f}\t{extra_values_str}\n")
+
+    return output_lines
+
+def process_file(file_path, interpolation_type, time_signature, dydx_file=None, tolerance=None, step=3):
+    timebase = Timebase.from_spec(time_signature)
+    dydx_by_tick = load_dydx(dydx_file, timebase) if dydx_file else None
+
+    with voxprofile.stage('read'):
+        with open(file_path, 'r') as file:
+            lines = file.readlines()
+
+    output_lines = process_lines(lines, interpolation_type, timebase, dydx_by_tick, tolerance, step)
+
+    with voxprofile.stage('write'):
+        with open(file_path, 'w') as file:
+            file.writelines(output_lines)
+
+def process_track_range(track, interpolation_type, start_tick=None, end_tick=None, dydx_by_tick=None, tolerance=None,
+                        step=3, cache=None):
+    lo, hi = track.index_range(start_tick, end_tick)
+    if hi - lo < 2:
+        raise VoxError("Not enough lines for processing.")
+
+    # Each laser in the range gets its own curve, so a range (or the whole track) never merges lasers; a single row
+    # of a laser cut by the range is kept as it is
+    curve = []
+    for laser_lo, laser_hi in track.laser_ranges(lo, hi):
+        rows = [(tick, value, track.row_flags(i)) for i, (tick, value) in
+                enumerate(zip(track.ticks[laser_lo:laser_hi].tolist(), track.values[laser_lo:laser_hi].tolist()),
+                          laser_lo)]
+        if len(rows) < 2:
+            curve.extend(rows)
+            continue
+        points, extra_values_list = prepare_points(rows, interpolation_type, dydx_by_tick)
+        curve.extend(build_curve(points, extra_values_list, interpolation_type, tolerance, step, cache))
+
+    track.replace_rows(lo, hi, [row[0] for row in curve], [row[1] for row in curve], [row[2] for row in curve])
+
+def parse_segment_spec(spec):
+    if os.path.isfile(spec):
+        with open(spec, 'r') as file:
+            entries = json.load(file)
+        if isinstance(entries, dict):
+            entries = [f"{key}={value}" for key, value in entries.items()]
+    else:
+        entries = spec.split(';')
+
+    types_by_index = []
+    types_by_start = {}
+    default_type = None
+    for entry in entries:
+        key, _, interpolation_type = entry.strip().rpartition('=')
+        key = key.strip()
+        interpolation_type = interpolation_type.strip().lower()
+        if not interpolation_type:
+            continue
+        check_interpolation_type(interpolation_type, allow_keep=True)
+
+        if not key:
+            types_by_index.append(interpolation_type)
+        elif key == '*':
+            default_type = interpolation_type
+        else:
+            types_by_start[key] = interpolation_type
+
+    return types_by_index, types_by_start, default_type
+
+def track_segments(track, lo, hi):
+    # A segment joins two consecutive control points of the same laser; slams have no length
+    node_types = track.flags[lo:hi, 0] if track.flags.shape[1] else np.full(hi - lo, '', dtype=object)
+    continues = (node_types[:-1] != '2') & (np.diff(track.ticks[lo:hi]) > 0)
+    return np.flatnonzero(continues) + lo
+
+def resolve_segment_types(track, segment_rows, segment_spec, default_type):
+    types_by_index, types_by_start, spec_default = segment_spec
+    types_by_tick = {track.timebase.parse(key): value for key, value in types_by_start.items()}
+
+    segment_types = []
+    for index, row in enumerate(segment_rows.tolist()):
+        interpolation_type = types_by_tick.get(int(track.ticks[row]))
+        if interpolation_type is None and index < len(types_by_index):
+            interpolation_type = types_by_index[index]
+        segment_types.append(interpolation_type or spec_default or default_type)
+
+    return segment_types
+
+def spline_runs(segment_rows, segment_types):
+    runs = []
+    for index, (row, interpolation_type) in enumerate(zip(segment_rows.tolist(), segment_types)):
+        if interpolation_type not in SPLINE_TYPES:
+            continue
+        if runs and runs[-1][1] == interpolation_type and runs[-1][0][-1] == row:
+            runs[-1][0].append(row + 1)
+        else:
+            runs.append(([row, row + 1], interpolation_type))
+    return runs
+
+def process_track_segments(track, segment_spec, default_type='keep', start_tick=None, end_tick=None, step=3,
+                           dydx_by_tick=None, tolerance=None, memo=None, cache=None):
+    # memo (a voxcache.MemoCache) keeps the generated points of every segment, keyed by everything they depend on,
+    # so that only segments whose control points or parameters changed are evaluated again
+    lo, hi = track.index_range(start_tick, end_tick)
+    segment_rows = track_segments(track, lo, hi)
+    segment_types = resolve_segment_types(track, segment_rows, segment_spec, default_type)
+
+    ticks = track.ticks.tolist()
+    values = track.values.tolist()
+    row_flags = {row: track.row_flags(row) for row in range(lo, hi)}
+
+    # Control points keep their values; their flags carry the type of the segment they start or end
+    control_flags = dict(row_flags)
+    for row, interpolation_type in zip(segment_rows.tolist(), segment_types):
+        if interpolation_type != 'keep':
+            control_flags[row + 1] = adjust_extra_values(row_flags[row + 1], interpolation_type)
+    for row, interpolation_type in zip(segment_rows.tolist(), segment_types):
+        if interpolation_type != 'keep':
+            control_flags[row] = adjust_extra_values(row_flags[row], interpolation_type)
+
+    new_ticks = ticks[lo:hi]
+    new_values = values[lo:hi]
+    new_flags = [control_flags[row] for row in range(lo, hi)]
+
+    def simplified(row, generated_ticks, generated_values):
+        if tolerance is not None and generated_ticks:
+            # Simplify between the two control points, which always stay
+            with voxprofile.stage('resample'):
+                keep = voxresample.simplify_mask([ticks[row]] + generated_ticks + [ticks[row + 1]],
+                                                 [values[row]] + generated_values + [values[row + 1]], tolerance)
+                generated_ticks = [tick for tick, kept in zip(generated_ticks, keep[1:-1].tolist()) if kept]
+                generated_values = [value for value, kept in zip(generated_values, keep[1:-1].tolist()) if kept]
+        return generated_ticks, generated_values
+
+    def add_generated(row, generated):
+        generated_ticks, generated_values = generated
+        new_ticks.extend(generated_ticks)
+        new_values.extend(generated_values)
+        new_flags.extend([['0'] + control_flags[row][1:]] * len(generated_ticks))
+
+    # A cubic_spline run of a single segment (a two-node laser) has nothing to fit: a natural cubic spline through
+    # two points is their line. A lone hermite segment is fitted from its two slopes.
+    runs = spline_runs(segment_rows, segment_types)
+    lone_rows = set(run_rows[0] for run_rows, interpolation_type in runs
+                    if len(run_rows) == 2 and interpolation_type == 'cubic_spline')
+    runs = [run for run in runs if run[0][0] not in lone_rows]
+
+    eased = [(row, 'sharp' if row in lone_rows else interpolation_type)
+             for row, interpolation_type in zip(segment_rows.tolist(), segment_types)
+             if interpolation_type in EASING_FUNCTIONS or interpolation_type in BEZIER_TYPES or row in lone_rows]
+    eased_keys = [(ticks[row], values[row], ticks[row + 1], values[row + 1], interpolation_type, step, tolerance)
+                  for row, interpolation_type in eased]
+    eased_curves = [memo.get(key) if memo is not None else None for key in eased_keys]
+    missing = [index for index, curve in enumerate(eased_curves) if curve is None]
+    if missing:
+        rows = np.array([eased[index][0] for index in missing])
+        with voxprofile.stage('evaluate'):
+            generated_ticks, generated_values, segment_ids = evaluate_segments(
+                track.ticks[rows], track.values[rows], track.ticks[rows + 1], track.values[rows + 1],
+                [eased[index][1] for index in missing], step)
+
+        interior = generated_ticks != track.ticks[rows][segment_ids]
+        bounds = np.searchsorted(segment_ids[interior], np.arange(len(rows) + 1))
+        generated_ticks = generated_ticks[interior].tolist()
+        generated_values = generated_values[interior].tolist()
+        for position, index in enumerate(missing):
+            eased_curves[index] = simplified(eased[index][0], generated_ticks[bounds[position]:bounds[position + 1]],
+                                             generated_values[bounds[position]:bounds[position + 1]])
+            if memo is not None:
+                memo.put(eased_keys[index], eased_curves[index])
+    for (row, _), curve in zip(eased, eased_curves):
+        add_generated(row, curve)
+
+    for run_rows, interpolation_type in runs:
+        points, _ = prepare_points([(ticks[row], values[row], row_flags[row]) for row in run_rows], interpolation_type,
+                                   dydx_by_tick)
+        key = (interpolation_type, tuple(points), step, tolerance)
+        curves = memo.get(key) if memo is not None else None
+        if curves is None:
+            control_ticks = set(ticks[row] for row in run_rows)
+            curve = [(tick, value) for tick, value in interpolate(points, interpolation_type, cache, step)
+                     if tick not in control_ticks]
+            curves = []
+            for row in run_rows[:-1]:
+                segment = [(tick, value) for tick, value in curve if ticks[row] < tick < ticks[row + 1]]
+                curves.append(simplified(row, [tick for tick, _ in segment], [value for _, value in segment]))
+            if memo is not None:
+                memo.put(key, curves)
+        for row, generated in zip(run_rows[:-1], curves):
+            add_generated(row, generated)
+
+    order = np.argsort(np.array(new_ticks, dtype=np.int64), kind='stable')
+    track.replace_rows(lo, hi, np.array(new_ticks, dtype=np.int64)[order], np.array(new_values)[order],
+                       [new_flags[i] for i in order.tolist()])
+
+def process_chart(file_path, interpolation_type, track_name, ranges=None, output_path=None, segment_spec=None, step=3,
+                  dydx_file=None, tolerance=None):
+    document = VoxDocument.load(file_path)
+    track = document.track(track_name)
+    dydx_by_tick = load_dydx(dydx_file, document.timebase) if dydx_file else None
+
+    for text in ranges or ['-']:
+        start_tick, end_tick = document.parse_range(text)
+        if segment_spec is None:
+            process_track_range(track, interpolation_type, start_tick, end_tick, dydx_by_tick, tolerance, step)
+        else:
+            process_track_segments(track, segment_spec, interpolation_type, start_tick, end_tick, step, dydx_by_tick,
+                                   tolerance)
+
+    output_path = output_path or output_path_for(file_path, '_edited')
+    document.save(output_path)
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate laser curves between control points.')
+    parser.add_argument('input_file', help='Snippet of laser rows, or a full .vox chart with --track.')
+    parser.add_argument('interpolation_type', type=str.lower, help='One of: ' + ', '.join(INTERPOLATION_TYPES))
+    parser.add_argument('time_signature', nargs='?', help='Time signature such as "4/4" or a .vox chart (snippet mode only).')
+    parser.add_argument('--track', help='Track of the chart to edit, e.g. 1 or TRACK8.')
+    parser.add_argument('--range', action='append', dest='ranges', metavar='START-END',
+                        help='Tick range to curve, e.g. 005,01,00-008,01,00. Repeat for several edits.')
+    parser.add_argument('--segments', metavar='SPEC',
+                        help='Curve every segment of the track: "type;type;..." by position, "005,01,00=type" by start, '
+                             '"*=type" as default, or a JSON file with a list or mapping. The positional type (or "keep") '
+                             'is used for segments the spec does not cover.')
+    parser.add_argument('--step', type=int, default=3,
+                        help='Tick step between generated points, for easings and splines alike (default: 3).')
+    parser.add_argument('--dydx', metavar='FILE',
+                        help='JSON from voxfinddydx ("-" for stdin) giving the cubic_hermite dy/dx of each control point. '
+                             'dy/dx in the rows themselves is per tick.')
+    parser.add_argument('--tolerance', type=float, metavar='VALUE',
+                        help='Adaptive output: keep the fewest generated points that reproduce the curve within VALUE.')
+    parser.add_argument('--cache-dir', help='Cache evaluated cubic_spline/cubic_hermite curves in this directory.')
+    parser.add_argument('--no-cache', action='store_true', help='Do not use the curve cache, even if VOX_CACHE_DIR is set.')
+    parser.add_argument('-o', '--output', help='Output chart path (default: <input>_edited.vox).')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+
+    if args.no_cache:
+        CURVE_CACHE = False
+    elif args.cache_dir:
+        CURVE_CACHE = CurveCache(args.cache_dir)
+
+    segment_mode = args.track and args.segments is not None
+    if args.interpolation_type not in INTERPOLATION_TYPES and not (segment_mode and args.interpolation_type == 'keep'):
+        print("Error: Interpolation type not recognized.")
+        sys.exit(1)
+    if not args.track and args.time_signature is None:
+        parser.error("time_signature is required in snippet mode")
+
+    try:
+        if args.track:
+            segment_spec = parse_segment_spec(args.segments) if segment_mode else None
+            output_path = process_chart(args.input_file, args.interpolation_type, args.track, args.ranges, args.output,
+                                        segment_spec, args.step, args.dydx, args.tolerance)
+            print(f"Chart saved as: {output_path}")
+        else:
+            process_file(args.input_file, args.interpolation_type, args.time_signature, args.dydx, args.tolerance,
+                         args.step)
+    except VoxError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -1,52 +1,67 @@
-import re
+import argparse
 import sys
 
-def parse_ticks(tick_string, beats_per_measure):
-    measure, beat, tick = map(int, re.findall(r'\d+', tick_string))
-    total_ticks = (measure - 1) * beats_per_measure * 48 + (beat - 1) * 48 + tick
-    return total_ticks, measure, beat, tick
+from voxtimebase import Timebase
+import voxprofile
+import voxtransform
+from voxtransform import Pipeline
 
-def format_ticks(total_ticks, beats_per_measure):
-    measure = total_ticks // (beats_per_measure * 48) + 1
-    remaining_ticks = total_ticks % (beats_per_measure * 48)
-    beat = remaining_ticks // 48 + 1
-    tick = remaining_ticks % 48
-    return f"{measure:03},{beat:02},{tick:02}"
+def invert_pipeline(measure_offset=0, beat_offset=0):
+    return Pipeline([('invert',), ('shift', measure_offset, beat_offset)])
 
-def process_file(file_path, time_signature, measure_offset=0, beat_offset=0):
-    beats_per_measure = int(time_signature.split('/')[0])
-    output_lines = []
+def process_lines(lines, timebase, measure_offset=0, beat_offset=0):
+    return list(voxtransform.transform_lines(lines, timebase, invert_pipeline(measure_offset, beat_offset)))
 
+def process_file(file_path, time_signature, measure_offset=0, beat_offset=0):
+    timebase = Timebase.from_spec(time_signature)
     with open(file_path, 'r') as file:
-        for line in file:
-            parts = line.split('\t')
-            tick_string, value = parts[0], float(parts[1])
-            extra_values = parts[2:]
+        return process_lines(file, timebase, measure_offset, beat_offset)
 
-            # Reverse the float value
-            reversed_value = 1.0 - value
+def process_track_range(track, start_tick=None, end_tick=None, measure_offset=0, beat_offset=0):
+    voxtransform.process_track_range(track, invert_pipeline(measure_offset, beat_offset), start_tick, end_tick)
 
-            # Parse the tick string and apply offsets
-            total_ticks, _, _, _ = parse_ticks(tick_string, beats_per_measure)
-            total_ticks += measure_offset * beats_per_measure * 48 + beat_offset * 48
-            new_tick_string = format_ticks(total_ticks, beats_per_measure)
+def process_chart(file_path, track_name, ranges=None, measure_offset=0, beat_offset=0, output_path=None):
+    return voxtransform.process_chart(file_path, track_name, invert_pipeline(measure_offset, beat_offset), ranges,
+                                      output_path)
 
-            # Construct the new line
-            new_line = f"{new_tick_string}\t{reversed_value:.6f}\t" + '\t'.join(extra_values)
-            output_lines.append(new_line)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Invert laser values and shift them by a measure/beat offset.',
+        usage='%(prog)s input_file <time_signature> <measure_offset> <beat_offset>\n'
+              '       %(prog)s chart.vox [<measure_offset> <beat_offset>] --track TRACK [--range START-END ...]')
+    parser.add_argument('input_file')
+    parser.add_argument('arguments', nargs='*', help=argparse.SUPPRESS)
+    parser.add_argument('--track', help='Track of the chart to edit, e.g. 1 or TRACK8.')
+    parser.add_argument('--range', action='append', dest='ranges', metavar='START-END',
+                        help='Tick range to invert, e.g. 005,01,00-008,01,00. Repeat for several edits.')
+    parser.add_argument('-o', '--output', help='Output path, "-" for stdout (default: <input>_edited.vox for charts, '
+                                               'the input itself for snippets).')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
 
-    return output_lines
+    if args.track:
+        if len(args.arguments) not in (0, 2):
+            parser.error("expected <measure_offset> <beat_offset> or no offsets with --track")
+        measure_offset, beat_offset = map(int, args.arguments or [0, 0])
+        output_path = process_chart(args.input_file, args.track, args.ranges, measure_offset, beat_offset, args.output)
+        if output_path != '-':
+            print(f"Chart saved as: {output_path}")
+        sys.exit(0)
 
-if __name__ == "__main__":
-    if len(sys.argv) != 5:
+    if len(args.arguments) != 3:
         print("Usage: python script.py <input_file> <time_signature> <measure_offset> <beat_offset>")
         sys.exit(1)
 
-    input_file = sys.argv[1]
-    time_signature = sys.argv[2]
-    measure_offset = int(sys.argv[3])
-    beat_offset = int(sys.argv[4])
+    input_file = args.input_file
+    time_signature = args.arguments[0]
+    measure_offset = int(args.arguments[1])
+    beat_offset = int(args.arguments[2])
+
+    if args.output:
+        voxtransform.process_file(input_file, time_signature, invert_pipeline(measure_offset, beat_offset), args.output)
+        sys.exit(0)
 
     processed_lines = process_file(input_file, time_signature, measure_offset, beat_offset)
-    with open(input_file, 'w') as file:
+    with voxprofile.stage('write'), open(input_file, 'w') as file:
         file.writelines(processed_lines)
@@ -1,102 +1,258 @@
-import argparse
-from scipy.interpolate import interp1d
-
-def convert_to_ticks(measure, beat, tick, beats_per_measure, ticks_per_beat):
-    return ((measure - 1) * beats_per_measure * ticks_per_beat) + ((beat - 1) * ticks_per_beat) + tick
-
-def interpolate_to_24th_notes(x_values, y_values):
-    x_min, x_max = min(x_values), max(x_values)
-    step_size = 12
-
-    if (x_max - x_min) % step_size != 0:
-        step_size = 8
-
-    x_new = range(x_min, x_max + 1, step_size)
-    interpolation_func = interp1d(x_values, y_values, kind='cubic', fill_value="extrapolate")
-    y_new = interpolation_func(x_new)
-    y_new = [0 if abs(y) < 1e-6 else round(max(0, min(1, y)), 6) for y in y_new]
-    return x_new, y_new
-
-def convert_from_ticks(tick, beats_per_measure, ticks_per_beat):
-    measure = tick // (beats_per_measure * ticks_per_beat) + 1
-    beat = (tick % (beats_per_measure * ticks_per_beat)) // ticks_per_beat + 1
-    tick_remainder = int(tick % ticks_per_beat)  
-    return measure, beat, tick_remainder
-
-def interpolate_data(x_values, y_values, extra_values):
-    if len(x_values) > 1 and x_values[0] == x_values[1]:
-        first_line = x_values.pop(0), y_values.pop(0), extra_values.pop(0)
-    else:
-        first_line = None
-
-    segments = []
-    start_index = 0
-    for i in range(1, len(x_values)):
-        if x_values[i] == x_values[i - 1]:
-            if start_index < i - 1:
-                segments.append((x_values[start_index:i], y_values[start_index:i], extra_values[start_index:i]))
-            start_index = i
-
-    if start_index < len(x_values) - 1:
-        segments.append((x_values[start_index:], y_values[start_index:], extra_values[start_index:]))
-
-    if len(x_values) > 1 and x_values[-1] == x_values[-2]:
-        last_line = x_values.pop(), y_values.pop(), extra_values.pop()
-    else:
-        last_line = None
-
-    interpolated_data = []
-    if first_line:
-        interpolated_data.append(first_line)
-
-    for seg_idx, (x_segment, y_segment, extras_segment) in enumerate(segments):
-        x_new, y_new = interpolate_to_24th_notes(x_segment, y_segment)
-        for x_idx, (x, y) in enumerate(zip(x_new, y_new)):
-            if seg_idx == 0 and x_idx == 0:
-                extras = extra_values[0]
-            else:
-                original_index = next((idx for idx, original_x in enumerate(x_segment) if original_x >= x), 0)
-                extras = extras_segment[min(original_index, len(extras_segment) - 1)]
-            interpolated_data.append((x, y, extras))
-
-    if last_line:
-        interpolated_data.append(last_line)
-    
-    return interpolated_data
-
-def main(input_file, time_signature):
-    numerator, denominator = map(int, time_signature.split('/'))
-    beats_per_measure = numerator
-    ticks_per_beat = int((4 / denominator) * 48)
-
-    with open(input_file, 'r') as file:
-        data_lines = file.readlines()
-
-    x_values, y_values, extra_values = [], [], []
-    for line in data_lines:
-        parts = line.strip().split('\t')
-        measure, beat, tick = map(int, parts[0].split(','))
-        y = float(parts[1])
-        x = convert_to_ticks(measure, beat, tick, beats_per_measure, ticks_per_beat)
-        x_values.append(x)
-        y_values.append(y)
-        extra_values.append(parts[2:]) 
-
-    interpolated_data = interpolate_data(x_values, y_values, extra_values)
-
-    output_data = []
-    for x, y, extras in interpolated_data:
-        measure, beat, tick = convert_from_ticks(x, beats_per_measure, ticks_per_beat)
-        output_line = "{:03d},{:02d},{:02d}\t{:.6f}\t{}".format(measure, beat, tick, y, '\t'.join(extras))
-        output_data.append(output_line)
-
-    with open('kshcurve.txt', 'w') as out_file:
-        out_file.write('\n'.join(output_data))
-        print("output written to kshcurve.txt")
-
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Interpolate 64th note laser points to 16th notes for ksh format.')
-    parser.add_argument('input_file', help='The input file containing the laser points.')
-    parser.add_argument('time_signature', help='Time signature in the format of "4/4".')
-    args = parser.parse_args()
-    main(args.input_file, args.time_signature)
\ No newline at end of file
+import argparse
+import sys
+
+import numpy as np
+from scipy.interpolate import make_interp_spline
+
+from voxdoc import LASER_TRACKS, VoxDocument, format_rows, track_section_name
+from voxerrors import VoxError
+from voxfiles import atomic_open, output_path_for, same_file
+from voxtimebase import Timebase
+import voxbinary
+import voxprofile
+import voxresample
+
+def interpolate_to_24th_notes(x_values, y_values, tolerance=None):
+    x_values = np.asarray(x_values, dtype=np.int64)
+    y_values = np.asarray(y_values, dtype=float)
+    order = np.argsort(x_values, kind='mergesort')
+    x_values, y_values = x_values[order], y_values[order]
+
+    x_min, x_max = int(x_values[0]), int(x_values[-1])
+    step_size = 12
+
+    if (x_max - x_min) % step_size != 0:
+        step_size = 8
+
+    # The laser's last point is kept even when the span is a multiple of neither step
+    x_new = np.arange(x_min, x_max + 1, step_size)
+    if x_new[-1] != x_max:
+        x_new = np.append(x_new, x_max)
+    with voxprofile.stage('fit'):
+        spline = make_interp_spline(x_values, y_values, k=min(3, len(x_values) - 1))
+    with voxprofile.stage('evaluate'):
+        y_new = spline(x_new, extrapolate=True)
+    # Rounding to 6 places is left to the writer, which formats with :.6f
+    y_new = np.where(np.abs(y_new) < 1e-6, 0.0, np.clip(y_new, 0, 1))
+    if tolerance is not None:
+        with voxprofile.stage('resample'):
+            x_new, y_new = voxresample.simplify(x_new, y_new, tolerance)
+    return x_new, y_new
+
+def split_segments(x_values):
+    # Repeated ticks (slams) split a laser into segments; single-point segments are dropped
+    breaks = np.flatnonzero(x_values[1:] == x_values[:-1]) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(x_values)]])
+    keep = ends - starts >= 2
+    return starts[keep], ends[keep]
+
+def interpolate_data(x_values, y_values, extra_values, tolerance=None):
+    x_values = np.asarray(x_values, dtype=np.int64)
+    y_values = np.asarray(y_values, dtype=float)
+    extra_values = list(extra_values)
+
+    if len(x_values) > 1 and x_values[0] == x_values[1]:
+        first_line = int(x_values[0]), float(y_values[0]), extra_values[0]
+        x_values, y_values, extra_values = x_values[1:], y_values[1:], extra_values[1:]
+    else:
+        first_line = None
+
+    starts, ends = split_segments(x_values)
+
+    if len(x_values) > 1 and x_values[-1] == x_values[-2]:
+        last_line = int(x_values[-1]), float(y_values[-1]), extra_values[-1]
+    elif len(x_values) and not len(starts):
+        # Nothing is left to resample, e.g. in a laser that is only a slam, but its end row is still written
+        last_line = int(x_values[-1]), float(y_values[-1]), extra_values[-1]
+    else:
+        last_line = None
+
+    interpolated_data = []
+    if first_line:
+        interpolated_data.append(first_line)
+
+    for seg_idx, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        x_segment = x_values[start:end]
+        x_new, y_new = interpolate_to_24th_notes(x_segment, y_values[start:end], tolerance)
+
+        # Each new point takes the extras of the first original point at or after it; points between the original
+        # ones are plain laser nodes, as in vox12curve, so that only the laser's own end row has node type 2
+        positions = np.minimum(np.searchsorted(x_segment, x_new, side='left'), end - start - 1)
+        generated = (x_segment[positions] != x_new).tolist()
+        extra_index = start + positions
+        if seg_idx == 0:
+            extra_index[0] = 0
+            generated[0] = False
+        extras = [['0'] + extra_values[i][1:] if is_generated and extra_values[i] else extra_values[i]
+                  for i, is_generated in zip(extra_index.tolist(), generated)]
+        interpolated_data.extend(zip(x_new.tolist(), y_new.tolist(), extras))
+
+    if last_line:
+        interpolated_data.append(last_line)
+
+    return interpolated_data
+
+def process_lines(data_lines, timebase, tolerance=None):
+    with voxprofile.stage('parse'):
+        x_values, y_values, extra_values = [], [], []
+        for line in data_lines:
+            parts = line.strip().split('\t')
+            y = float(parts[1])
+            x = timebase.parse(parts[0])
+            x_values.append(x)
+            y_values.append(y)
+            extra_values.append(parts[2:]) 
+
+    interpolated_data = interpolate_data(x_values, y_values, extra_values, tolerance)
+
+    with voxprofile.stage('format'):
+        output_data = []
+        for x, y, extras in interpolated_data:
+            output_line = "{}\t{:.6f}\t{}".format(timebase.format(x), y, '\t'.join(extras))
+            output_data.append(output_line)
+
+    return output_data
+
+def main(input_file, time_signature, output_path='kshcurve.txt', tolerance=None):
+    timebase = Timebase.from_spec(time_signature)
+
+    with voxprofile.stage('read'):
+        with open(input_file, 'r') as file:
+            data_lines = file.readlines()
+
+    output_data = process_lines(data_lines, timebase, tolerance)
+
+    with voxprofile.stage('write'):
+        with open(output_path, 'w') as out_file:
+            out_file.write('\n'.join(output_data))
+            print(f"output written to {output_path}")
+
+def process_track_range(track, start_tick=None, end_tick=None, tolerance=None, memo=None):
+    # memo (a voxcache.MemoCache) keeps the resampled rows of every laser, so unchanged lasers are not refitted
+    lo, hi = track.index_range(start_tick, end_tick)
+
+    interpolated_data = []
+    for laser_lo, laser_hi in track.laser_ranges(lo, hi):
+        extra_values = [track.row_flags(i) for i in range(laser_lo, laser_hi)]
+        key = (track.ticks[laser_lo:laser_hi].tobytes(), track.values[laser_lo:laser_hi].tobytes(),
+               tuple(map(tuple, extra_values)), tolerance)
+        laser_data = memo.get(key) if memo is not None else None
+        if laser_data is None:
+            laser_data = interpolate_data(track.ticks[laser_lo:laser_hi], track.values[laser_lo:laser_hi],
+                                          extra_values, tolerance)
+            if memo is not None:
+                memo.put(key, laser_data)
+        interpolated_data.extend(laser_data)
+
+    track.replace_rows(lo, hi, [x for x, _, _ in interpolated_data], [y for _, y, _ in interpolated_data],
+                       [extras for _, _, extras in interpolated_data])
+
+def process_chart(file_path, track_names=None, ranges=None, output_path=None, tolerance=None):
+    document = VoxDocument.load(file_path)
+
+    for track_name in track_names or [name for name in LASER_TRACKS if name in document.sections]:
+        track = document.track(track_name)
+        for text in ranges or ['-']:
+            start_tick, end_tick = document.parse_range(text)
+            process_track_range(track, start_tick, end_tick, tolerance)
+
+    output_path = output_path or output_path_for(file_path, '_edited')
+    document.save(output_path)
+    return output_path
+
+def export_laser(timebase, rows, tolerance=None):
+    ticks = timebase.parse_column(row[0] for row in rows)
+    values = np.array([float(row[1]) for row in rows], dtype=float)
+    interpolated_data = interpolate_data(ticks, values, [[flag for flag in row[2:] if flag != ''] for row in rows],
+                                         tolerance)
+    return format_rows(timebase, [x for x, _, _ in interpolated_data], [y for _, y, _ in interpolated_data],
+                       [extras for _, _, extras in interpolated_data])
+
+def export_lines(lines, track_names=None, tolerance=None):
+    # Streams a chart and resamples its lasers one at a time, so memory is bounded by the longest laser. The
+    # output matches process_chart without ranges; BEAT INFO has to come before the laser tracks.
+    track_names = set(track_section_name(name) for name in track_names) if track_names else set(LASER_TRACKS)
+    timebase = None
+    beat_info = None
+    section = None
+    laser = []
+
+    for line in lines:
+        stripped = line.strip()
+        if section is None:
+            if stripped.startswith('#') and stripped != '#END':
+                section = stripped[1:]
+                if section == 'BEAT INFO':
+                    if timebase is not None:
+                        raise VoxError("BEAT INFO must come before the laser tracks to stream a chart.")
+                    beat_info = []
+                elif section in track_names and timebase is None:
+                    timebase = Timebase.from_beat_info(beat_info or [])
+            yield line
+        elif stripped == '#END':
+            if laser:
+                yield from export_laser(timebase, laser, tolerance)
+                laser = []
+            section = None
+            yield line
+        elif section in track_names:
+            # Lasers run up to and including a row whose node type is 2; other lines are dropped, as in Track
+            if line[:1].isdigit():
+                laser.append(line.rstrip('\r\n').split('\t'))
+                if len(laser[-1]) > 2 and laser[-1][2] == '2':
+                    yield from export_laser(timebase, laser, tolerance)
+                    laser = []
+        else:
+            if section == 'BEAT INFO':
+                beat_info.append(line)
+            yield line
+
+    if laser:
+        yield from export_laser(timebase, laser, tolerance)
+
+def export_chart(file_path, output_path=None, track_names=None, tolerance=None):
+    output_path = output_path or output_path_for(file_path, '_edited')
+    with voxprofile.stage('export'):
+        with open(file_path, 'r') as source:
+            if output_path == '-':
+                sys.stdout.writelines(export_lines(source, track_names, tolerance))
+                sys.stdout.flush()
+            else:
+                # The chart is still being read, so an in-place export goes through a temporary file
+                with (atomic_open if same_file(file_path, output_path) else open)(output_path, 'w') as file:
+                    file.writelines(export_lines(source, track_names, tolerance))
+    return output_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Interpolate 64th note laser points to 16th notes for ksh format.')
+    parser.add_argument('input_file', help='The input file containing the laser points, or a full .vox chart with --chart/--track.')
+    parser.add_argument('time_signature', nargs='?', help='Time signature in the format of "4/4", or a .vox chart to read the beat info from.')
+    parser.add_argument('--chart', action='store_true', help='Resample every laser track of a full .vox chart.')
+    parser.add_argument('--track', action='append', dest='tracks', help='Only resample this track, e.g. 1 or TRACK8. Repeatable.')
+    parser.add_argument('--range', action='append', dest='ranges', metavar='START-END',
+                        help='Tick range to resample, e.g. 005,01,00-008,01,00. Repeat for several ranges.')
+    parser.add_argument('-o', '--output',
+                        help='Output path (default: <input>_edited.vox for charts, kshcurve.txt for snippets); '
+                             '"-" streams a chart to stdout.')
+    parser.add_argument('--tolerance', type=float, metavar='VALUE',
+                        help='Adaptive output: keep the fewest grid points that reproduce the curve within VALUE.')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+    if (args.chart or args.tracks) and not args.ranges and not voxbinary.is_binary(args.input_file):
+        # Whole tracks of a text chart are exported without loading the chart
+        try:
+            output_path = export_chart(args.input_file, args.output, args.tracks, args.tolerance)
+        except VoxError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if output_path != '-':
+            print(f"Chart saved as: {output_path}")
+    elif args.chart or args.tracks:
+        output_path = process_chart(args.input_file, args.tracks, args.ranges, args.output, args.tolerance)
+        print(f"Chart saved as: {output_path}")
+    elif args.time_signature is None:
+        parser.error("time_signature is required without --chart or --track")
+    else:
+        main(args.input_file, args.time_signature, args.output or 'kshcurve.txt', args.tolerance)
\ No newline at end of file
@@ -0,0 +1,192 @@
+import contextlib
+
+import numpy as np
+
+import vox10to12
+import vox12curve
+import vox12invert
+import vox12tokshcurve
+import voxdetect
+import voxfinddydx
+import voxresample
+import voxtransform
+from voxdoc import LASER_TRACKS, Track, VoxDocument
+from voxerrors import VoxError
+from voxtimebase import Timebase
+
+# In-memory entry points for the tools. Nothing here reads or writes files unless it is given a path,
+# and bad input raises VoxError instead of exiting.
+
+__all__ = [
+    'VoxError', 'VoxDocument', 'Track', 'Timebase', 'LASER_TRACKS', 'INTERPOLATION_TYPES',
+    'timebase', 'load', 'loads', 'dumps', 'save', 'parse_track', 'format_track',
+    'convert_v10', 'interpolate', 'curve', 'curve_lines', 'invert', 'invert_lines', 'transform', 'transform_lines',
+    'ksh_resample', 'ksh', 'ksh_lines', 'find_dydx', 'detect',
+]
+
+INTERPOLATION_TYPES = vox12curve.INTERPOLATION_TYPES
+
+@contextlib.contextmanager
+def malformed_rows():
+    try:
+        yield
+    except VoxError:
+        raise
+    except (ValueError, IndexError) as e:
+        raise VoxError(f"Malformed row: {e}") from e
+
+def as_lines(source):
+    if isinstance(source, str):
+        return source.splitlines(keepends=True)
+    return list(source)
+
+def timebase(spec='4/4'):
+    if isinstance(spec, Timebase):
+        return spec
+    if isinstance(spec, VoxDocument):
+        return spec.timebase
+    with malformed_rows():
+        return Timebase.from_spec(spec)
+
+def load(file_path):
+    with malformed_rows():
+        return VoxDocument.load(file_path)
+
+def loads(text):
+    with malformed_rows():
+        return VoxDocument.parse(as_lines(text))
+
+def dumps(document):
+    return document.dumps()
+
+def save(document, file_path):
+    document.save(file_path)
+
+def parse_track(lines, time_signature='4/4', name='TRACK1'):
+    with malformed_rows():
+        return Track.parse(name, timebase(time_signature), as_lines(lines))
+
+def format_track(track):
+    return list(track.lines())
+
+def to_tick(track, position):
+    if position is None or isinstance(position, (int, np.integer)):
+        return position
+    with malformed_rows():
+        return track.timebase.parse(position)
+
+def dydx_by_tick(dydx, track_timebase):
+    # Either voxfinddydx results or a plain {tick: dydx} mapping of slopes per tick
+    if not dydx:
+        return None
+    if 'points' in dydx:
+        return vox12curve.dydx_from_results(dydx, track_timebase)
+    return {int(tick): float(value) for tick, value in dydx.items()}
+
+def convert_v10(lines):
+    with malformed_rows():
+        return list(vox10to12.convert_lines(as_lines(lines)))
+
+def interpolate(ticks, values, interpolation_type, dydx=None, cache=False, tolerance=None, step=3):
+    vox12curve.check_interpolation_type(interpolation_type)
+    ticks = np.asarray(ticks, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    if len(ticks) != len(values):
+        raise VoxError("ticks and values must have the same length.")
+    if len(ticks) < 2:
+        raise VoxError("Not enough points for processing.")
+
+    dydx = [None] * len(ticks) if dydx is None else np.asarray(dydx, dtype=float).tolist()
+    points = list(zip(ticks.tolist(), values.tolist(), dydx))
+    curve_points = vox12curve.interpolate(points, interpolation_type, cache=cache, step=step)
+    curve_ticks = np.array([tick for tick, _ in curve_points], dtype=np.int64)
+    curve_values = np.array([value for _, value in curve_points], dtype=float)
+    if tolerance is not None:
+        return voxresample.simplify(curve_ticks, curve_values, tolerance)
+    return curve_ticks, curve_values
+
+def curve(track, interpolation_type, start=None, end=None, dydx=None, segments=None, step=3, tolerance=None,
+          cache=False):
+    vox12curve.check_interpolation_type(interpolation_type, allow_keep=segments is not None)
+    start_tick, end_tick = to_tick(track, start), to_tick(track, end)
+    track_dydx = dydx_by_tick(dydx, track.timebase)
+
+    if segments is None:
+        vox12curve.process_track_range(track, interpolation_type, start_tick, end_tick, track_dydx, tolerance, step,
+                                       cache)
+    else:
+        if isinstance(segments, str):
+            segments = vox12curve.parse_segment_spec(segments)
+        vox12curve.process_track_segments(track, segments, interpolation_type, start_tick, end_tick, step, track_dydx,
+                                          tolerance, cache=cache)
+    return track
+
+def curve_lines(lines, interpolation_type, time_signature='4/4', dydx=None, tolerance=None, step=3, cache=False):
+    vox12curve.check_interpolation_type(interpolation_type)
+    lines_timebase = timebase(time_signature)
+    with malformed_rows():
+        return vox12curve.process_lines(as_lines(lines), interpolation_type, lines_timebase,
+                                        dydx_by_tick(dydx, lines_timebase), tolerance, step, cache)
+
+def invert(track, start=None, end=None, measure_offset=0, beat_offset=0):
+    vox12invert.process_track_range(track, to_tick(track, start), to_tick(track, end), measure_offset, beat_offset)
+    return track
+
+def invert_lines(lines, time_signature='4/4', measure_offset=0, beat_offset=0):
+    lines_timebase = timebase(time_signature)
+    with malformed_rows():
+        return vox12invert.process_lines(as_lines(lines), lines_timebase, measure_offset, beat_offset)
+
+def transform(track, operations, start=None, end=None):
+    # operations are tuples such as ('invert',), ('scale', 0.5, 0.5), ('clamp', 0, 1) or ('shift', 1, 2)
+    pipeline = operations if isinstance(operations, voxtransform.Pipeline) else voxtransform.Pipeline(operations)
+    voxtransform.process_track_range(track, pipeline, to_tick(track, start), to_tick(track, end))
+    return track
+
+def transform_lines(lines, operations, time_signature='4/4'):
+    pipeline = operations if isinstance(operations, voxtransform.Pipeline) else voxtransform.Pipeline(operations)
+    lines_timebase = timebase(time_signature)
+    with malformed_rows():
+        return list(voxtransform.transform_lines(as_lines(lines), lines_timebase, pipeline))
+
+def ksh_resample(ticks, values, tolerance=None):
+    if len(ticks) < 2:
+        raise VoxError("Not enough points for processing.")
+    return vox12tokshcurve.interpolate_to_24th_notes(ticks, values, tolerance)
+
+def ksh(track, start=None, end=None, tolerance=None):
+    vox12tokshcurve.process_track_range(track, to_tick(track, start), to_tick(track, end), tolerance)
+    return track
+
+def ksh_lines(lines, time_signature='4/4', tolerance=None):
+    lines_timebase = timebase(time_signature)
+    with malformed_rows():
+        return [line + '\n' for line in vox12tokshcurve.process_lines(as_lines(lines), lines_timebase, tolerance)]
+
+def find_dydx(control_points, interpolated_points, time_signature='4/4'):
+    # Points are (tick, value) pairs or snippet rows
+    points_timebase = timebase(time_signature)
+    with malformed_rows():
+        if isinstance(control_points, str) or (len(control_points) and isinstance(control_points[0], str)):
+            control_points = voxfinddydx.parse_lines(as_lines(control_points), points_timebase)
+        if isinstance(interpolated_points, str) or (len(interpolated_points) and isinstance(interpolated_points[0], str)):
+            interpolated_points = voxfinddydx.parse_lines(as_lines(interpolated_points), points_timebase)
+
+    control_points = [(int(tick), float(value)) for tick, value in control_points]
+    interpolated_points = [(int(tick), float(value)) for tick, value in interpolated_points]
+    if len(control_points) < 2:
+        raise VoxError("At least two control points are needed.")
+    return voxfinddydx.build_results(control_points, interpolated_points, points_timebase)
+
+def detect(track, start=None, end=None, tolerance=voxdetect.DEFAULT_TOLERANCE, types=None, reduce=False):
+    # Report of the detected segments; with reduce=True the track keeps only their control points
+    candidates = voxdetect.CANDIDATE_TYPES if types is None else [name.lower() for name in types]
+    unknown = [name for name in candidates if name not in voxdetect.CANDIDATE_TYPES]
+    if unknown:
+        raise VoxError(f"Unknown candidate type(s): {', '.join(unknown)}")
+    lo, hi, segments, rows = voxdetect.detect_track(track, to_tick(track, start), to_tick(track, end), tolerance,
+                                                    candidates)
+    report = voxdetect.track_report(track, lo, hi, segments, rows)
+    if reduce:
+        voxdetect.reduce_track(track, lo, hi, rows)
+    return report
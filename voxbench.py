@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import vox10to12
+import vox12curve
+import vox12invert
+import vox12tokshcurve
+import voxdetect
+import voxfinddydx
+from voxtimebase import Timebase
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+
+def generate_v10_chart(measures, lasers_per_measure=4, notes_per_measure=16, seed=0):
+    rng = np.random.default_rng(seed)
+    timebase = Timebase.from_time_signature('4/4')
+    measure_ticks = timebase.measure_ticks[0]
+
+    lines = [
+        '//====================================\n',
+        '// SOUND VOLTEX OUTPUT TEXT FILE\n',
+        '//====================================\n',
+        '\n',
+        '#FORMAT VERSION\n', '10\n', '#END\n', '\n',
+        '#BEAT INFO\n', '001,01,00\t4\t4\n', '#END\n', '\n',
+        '#BPM INFO\n', '001,01,00\t180.00\t4\n', '#END\n', '\n',
+    ]
+
+    for track in range(1, 9):
+        lines.append(f'#TRACK{track}\n')
+        if track in (1, 8):
+            # Each laser starts on a beat and runs through a few 32nd-note nodes
+            step = measure_ticks // lasers_per_measure
+            for start in range(0, measures * measure_ticks, step):
+                nodes = int(rng.integers(2, 6))
+                ticks = start + np.sort(rng.choice(np.arange(0, step, 6), nodes, replace=False))
+                positions = rng.integers(0, 128, nodes)
+                for i, (tick, position) in enumerate(zip(ticks.tolist(), positions.tolist())):
+                    node_type = 1 if i == 0 else 2 if i == nodes - 1 else 0
+                    lines.append(f"{timebase.format(tick)}\t{position}\t{node_type}\t0\t0\t2\t0\n")
+        else:
+            step = measure_ticks // notes_per_measure
+            for tick in range(0, measures * measure_ticks, step):
+                if rng.random() < 0.5:
+                    lines.append(f"{timebase.format(tick)}\t0\t0\n")
+        lines.append('#END\n\n')
+
+    return lines
+
+def generate_laser_snippet(points, spacing=6, dydx=False, seed=0):
+    rng = np.random.default_rng(seed)
+    timebase = Timebase.from_time_signature('4/4')
+    ticks = np.arange(points) * spacing
+    values = np.clip(np.cumsum(rng.normal(0, 0.05, points)) + 0.5, 0, 1)
+
+    lines = []
+    for i, (tick, value) in enumerate(zip(ticks.tolist(), values.tolist())):
+        node_type = 1 if i == 0 else 2 if i == points - 1 else 0
+        row = [timebase.format(tick), f"{value:.6f}", str(node_type), '0', '0', '2', '0', '0', '0']
+        if dydx:
+            row.append(f"{rng.normal(0, 1):.6f}")
+        lines.append('\t'.join(row) + '\n')
+    return lines
+
+def write_lines(directory, name, lines):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as file:
+        file.writelines(lines)
+    return path
+
+def measure(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+def bench_cases(size, directory):
+    timebase = Timebase.from_time_signature('4/4')
+
+    chart = generate_v10_chart(max(1, size // 64))
+    chart_path = write_lines(directory, 'chart.vox', chart)
+    yield 'vox10to12.process_file', 'lines', len(chart), lambda: vox10to12.process_file(chart_path)
+
+    snippet = generate_laser_snippet(size, dydx=True)
+    rows = [line.rstrip('\n').split('\t') for line in snippet]
+    points = [(timebase.parse(row[0]), float(row[1]), float(row[9])) for row in rows]
+    sparse_points = points[::max(1, len(points) // 16)]
+    span = (points[-1][0] - points[0][0]) // 3 + 1
+    for interpolation_type in vox12curve.INTERPOLATION_TYPES:
+        curve_points = sparse_points if interpolation_type in vox12curve.SPLINE_TYPES else [points[0], points[-1]]
+        yield (f"vox12curve.interpolate[{interpolation_type}]", 'points', span,
+               lambda curve_points=curve_points, interpolation_type=interpolation_type:
+               vox12curve.interpolate(curve_points, interpolation_type, cache=False))
+
+    snippet_path = write_lines(directory, 'snippet.txt', snippet)
+    yield 'vox12invert.process_file', 'lines', len(snippet), lambda: vox12invert.process_file(snippet_path, '4/4', 1, 0)
+
+    x_values = [point[0] for point in points]
+    y_values = [point[1] for point in points]
+    extra_values = [row[2:] for row in rows]
+    yield ('vox12tokshcurve.interpolate_data', 'points', len(points),
+           lambda: vox12tokshcurve.interpolate_data(list(x_values), list(y_values), list(extra_values)))
+
+    dense = vox12curve.interpolate(sparse_points, 'cubic_spline', cache=False)
+    control_points = [(tick, value) for tick, value, _ in sparse_points]
+    yield ('voxfinddydx.build_results', 'points', len(dense),
+           lambda: voxfinddydx.build_results(control_points, dense, timebase))
+
+    dense_ticks = np.array([tick for tick, _ in dense], dtype=np.int64)
+    dense_values = np.array([value for _, value in dense])
+    yield 'voxdetect.detect', 'points', len(dense), lambda: voxdetect.detect(dense_ticks, dense_values)
+
+def run(sizes, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for name, unit, count, function in bench_cases(size, directory):
+                seconds, peak = measure(function, repeat)
+                results.append({
+                    'name': name,
+                    'size': size,
+                    'unit': unit,
+                    'count': count,
+                    'seconds': seconds,
+                    'throughput': count / seconds if seconds else float('inf'),
+                    'peak_bytes': peak,
+                })
+    return results
+
+def print_results(results, baseline=None, threshold=0.2):
+    previous = {(result['name'], result['size']): result for result in baseline or []}
+    regressions = 0
+
+    print(f"{'benchmark':<48} {'size':>7} {'wall (ms)':>10} {'throughput':>18} {'peak (KiB)':>11} {'vs base':>8}")
+    for result in results:
+        line = (f"{result['name']:<48} {result['size']:>7} {result['seconds'] * 1000:>10.2f} "
+                f"{result['throughput']:>12.0f} {result['unit'] + '/s':<5} {result['peak_bytes'] / 1024:>11.1f}")
+        base = previous.get((result['name'], result['size']))
+        if base:
+            ratio = result['seconds'] / base['seconds']
+            line += f" {ratio:>7.2f}x"
+            if ratio > 1 + threshold:
+                regressions += 1
+                line += '  REGRESSION'
+        print(line)
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vox tools on synthetic charts and laser snippets.')
+    parser.add_argument('--sizes', default='1000,10000', help='Comma-separated chart/snippet sizes in rows.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case; the best one is reported.')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results to this JSON file.')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='FILE',
+                        help=f'Store the results as the baseline (default: {DEFAULT_BASELINE}).')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='FILE',
+                        help='Compare against a stored baseline and exit non-zero on regressions.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Slowdown ratio counted as a regression.')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)['results']
+
+    results = run([int(size) for size in args.sizes.split(',')], args.repeat)
+    regressions = print_results(results, baseline, args.threshold)
+
+    report = {
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    for path in filter(None, [args.json, args.save_baseline]):
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {path}")
+
+    if regressions:
+        print(f"{regressions} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import json
+import struct
+
+import numpy as np
+
+from voxerrors import VoxError
+from voxfiles import atomic_open
+
+# A .voxb file is MAGIC, a little-endian uint32 version and uint64 header length, a JSON header and then the raw
+# arrays the header describes, each aligned to ALIGNMENT bytes so that they can be memory-mapped in place.
+MAGIC = b'VOXB'
+VERSION = 1
+ALIGNMENT = 64
+SUFFIX = '.voxb'
+
+PREFIX = struct.Struct('<4sIQ')
+
+def is_binary(file_path):
+    try:
+        with open(file_path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write(file_path, meta, arrays):
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    specs = {}
+    offset = 0
+    for name, array in arrays.items():
+        specs[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = aligned(offset + array.nbytes)
+
+    header = json.dumps({'meta': meta, 'arrays': specs}).encode()
+    data_start = aligned(PREFIX.size + len(header))
+    # Written next to the target and renamed into place, so a chart still mapped from file_path stays intact
+    with atomic_open(file_path, 'wb') as file:
+        file.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        file.write(header)
+        file.write(b'\0' * (data_start - PREFIX.size - len(header)))
+        for name, array in arrays.items():
+            file.seek(data_start + specs[name]['offset'])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+
+def read_header(file_path):
+    with open(file_path, 'rb') as file:
+        magic, version, header_length = PREFIX.unpack(file.read(PREFIX.size))
+        if magic != MAGIC:
+            raise VoxError(f"{file_path} is not a binary chart.")
+        if version != VERSION:
+            raise VoxError(f"{file_path} has unsupported binary chart version {version}.")
+        header = json.loads(file.read(header_length))
+    return header, aligned(PREFIX.size + header_length)
+
+def read(file_path, mmap=True):
+    # Memory-mapped arrays are copy-on-write: edits stay in memory and never reach the file
+    header, data_start = read_header(file_path)
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        shape = tuple(spec['shape'])
+        offset = data_start + spec['offset']
+        if not mmap or not int(np.prod(shape)):
+            with open(file_path, 'rb') as file:
+                file.seek(offset)
+                arrays[name] = np.fromfile(file, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        else:
+            arrays[name] = np.memmap(file_path, dtype=dtype, mode='c', offset=offset, shape=shape)
+    return header['meta'], arrays
+
+def section_lines(file_path, name):
+    # Text rows of a section kept as text, e.g. BEAT INFO, without touching the arrays
+    header, _ = read_header(file_path)
+    for item in header['meta']['items']:
+        if item.get('name') == name:
+            return item.get('lines', [])
+    return []
@@ -0,0 +1,126 @@
+import hashlib
+import os
+
+import numpy as np
+
+from voxfiles import atomic_open
+
+CACHE_VERSION = 2
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def default_cache_dir():
+    return os.environ.get('VOX_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'vox10to12')
+
+class CurveCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._total_bytes = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        if not os.environ.get('VOX_CACHE_DIR'):
+            return None
+        return cls(max_bytes=int(os.environ.get('VOX_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)))
+
+    def key(self, points, interpolation_type, step):
+        # Absolute ticks already encode the time signature the points were parsed with
+        ticks = np.array([point[0] for point in points], dtype=np.int64)
+        values = np.array([point[1] for point in points], dtype=np.float64)
+        dydx = np.array([np.nan if point[2] is None else point[2] for point in points], dtype=np.float64)
+
+        digest = hashlib.sha256(f"{CACHE_VERSION}|{interpolation_type}|{step}|".encode())
+        for array in (ticks, values, dydx):
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.npy')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            curve = np.load(path, allow_pickle=False)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return curve[0].astype(np.int64), curve[1]
+
+    def put(self, key, ticks, values):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with atomic_open(path, 'wb') as file:
+            np.save(file, np.stack([np.asarray(ticks, dtype=np.float64), np.asarray(values, dtype=np.float64)]))
+
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        else:
+            self._total_bytes += os.path.getsize(path)
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.npy'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def evict(self, max_bytes=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total_bytes = sum(size for _, size, _ in entries)
+
+        # Least recently used first; get() refreshes the mtime of every hit
+        for _, size, path in entries:
+            if total_bytes <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+
+        self._total_bytes = total_bytes
+
+class MemoCache:
+    # In-memory results of a long-running process such as voxwatch. Entries not used since the last prune() are
+    # dropped by it, so the cache follows the charts being edited instead of growing with every edit.
+    def __init__(self):
+        self._entries = {}
+        self._used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._used.add(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._used.add(key)
+
+    def prune(self):
+        stale = [key for key in self._entries if key not in self._used]
+        for key in stale:
+            del self._entries[key]
+        self._used = set()
+        return len(stale)
+
+    def reset_stats(self):
+        self.hits = self.misses = 0
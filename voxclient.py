@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# Kept free of numpy/scipy so a request costs only the interpreter start and one round trip
+
+class ServerError(Exception):
+    pass
+
+def default_socket_path():
+    if os.environ.get('VOX_SOCKET'):
+        return os.environ['VOX_SOCKET']
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, f"voxserver-{os.getuid()}.sock")
+
+class Client:
+    def __init__(self, socket_path=None, timeout=None):
+        socket_path = socket_path or default_socket_path()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            self.socket.close()
+            raise ServerError(f"no voxserver listening on {socket_path} (start it with python voxserver.py)")
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, job, **params):
+        self.file.write((json.dumps(dict(params, job=job)) + '\n').encode())
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ServerError("Server closed the connection.")
+        response = json.loads(line)
+        if not response['ok']:
+            raise ServerError(response['error'])
+        return response['result']
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def request(job, socket_path=None, **params):
+    with Client(socket_path) as client:
+        return client.request(job, **params)
+
+def absolute(path):
+    # The server may run in another directory, so every path is sent absolute
+    if path is None or path == '-':
+        return path
+    return os.path.abspath(path)
+
+def time_signature_param(time_signature):
+    return absolute(time_signature) if os.path.isfile(time_signature) else time_signature
+
+def segments_param(segments):
+    # A spec file is opened by the server; an inline spec is sent as it is
+    return absolute(segments) if segments is not None and os.path.isfile(segments) else segments
+
+def read_lines(file_path):
+    with (sys.stdin if file_path == '-' else open(file_path, 'r')) as file:
+        return file.readlines()
+
+def write_lines(file_path, lines, end=''):
+    with open(file_path, 'w') as file:
+        file.write(end.join(lines))
+
+def run_curve(args):
+    if args.track:
+        if args.dydx == '-':
+            sys.exit("Error: --dydx - is only supported in snippet mode; pass the JSON file instead")
+        return request('curve', args.socket, chart=absolute(args.input_file), type=args.interpolation_type,
+                       track=args.track, ranges=args.ranges, segments=segments_param(args.segments), step=args.step,
+                       dydx=absolute(args.dydx), tolerance=args.tolerance, output=absolute(args.output))
+    if args.time_signature is None:
+        sys.exit("Error: time_signature is required in snippet mode")
+
+    dydx = None
+    if args.dydx:
+        with (sys.stdin if args.dydx == '-' else open(args.dydx, 'r')) as file:
+            dydx = json.load(file)
+    result = request('curve', args.socket, lines=read_lines(args.input_file), type=args.interpolation_type,
+                     time_signature=time_signature_param(args.time_signature), dydx=dydx, tolerance=args.tolerance,
+                     step=args.step)
+    write_lines(args.input_file, result['lines'])
+
+def run_invert(args):
+    if args.track:
+        measure_offset, beat_offset = map(int, args.arguments or [0, 0])
+        return request('invert', args.socket, chart=absolute(args.input_file), track=args.track, ranges=args.ranges,
+                       measure_offset=measure_offset, beat_offset=beat_offset, output=absolute(args.output))
+    if len(args.arguments) != 3:
+        sys.exit("Usage: voxclient.py invert <input_file> <time_signature> <measure_offset> <beat_offset>")
+
+    time_signature, measure_offset, beat_offset = args.arguments
+    result = request('invert', args.socket, lines=read_lines(args.input_file),
+                     time_signature=time_signature_param(time_signature),
+                     measure_offset=int(measure_offset), beat_offset=int(beat_offset))
+    write_lines(args.input_file, result['lines'])
+
+def run_ksh(args):
+    if args.chart or args.tracks:
+        return request('ksh', args.socket, chart=absolute(args.input_file), tracks=args.tracks, ranges=args.ranges,
+                       tolerance=args.tolerance, output=absolute(args.output))
+    if args.time_signature is None:
+        sys.exit("Error: time_signature is required without --chart or --track")
+
+    result = request('ksh', args.socket, lines=read_lines(args.input_file),
+                     time_signature=time_signature_param(args.time_signature), tolerance=args.tolerance)
+    write_lines('kshcurve.txt', result['lines'], '\n')
+    print("output written to kshcurve.txt")
+
+def run_dydx(args):
+    result = request('dydx', args.socket, control_lines=read_lines(args.control_points),
+                     interpolated_lines=read_lines(args.interpolated_points),
+                     time_signature=time_signature_param(args.time_signature), format=args.format)
+    sys.stdout.write(result['text'])
+
+def add_chart_arguments(parser):
+    parser.add_argument('--range', action='append', dest='ranges', metavar='START-END', help='Tick range to edit.')
+    parser.add_argument('-o', '--output', help='Output chart path (default: <input>_edited.vox).')
+
+def main():
+    parser = argparse.ArgumentParser(description='Send curve, invert, ksh and dydx jobs to a running voxserver.')
+    parser.add_argument('--socket', default=None, help='Server socket path (default: $VOX_SOCKET or a per-user socket).')
+    subparsers = parser.add_subparsers(dest='job', required=True)
+
+    curve = subparsers.add_parser('curve', help='Same arguments as vox12curve.py.')
+    curve.add_argument('input_file')
+    curve.add_argument('interpolation_type', type=str.lower)
+    curve.add_argument('time_signature', nargs='?')
+    curve.add_argument('--track')
+    curve.add_argument('--segments', metavar='SPEC')
+    curve.add_argument('--step', type=int, default=3)
+    curve.add_argument('--dydx', metavar='FILE')
+    curve.add_argument('--tolerance', type=float, metavar='VALUE')
+    add_chart_arguments(curve)
+    curve.set_defaults(run=run_curve)
+
+    invert = subparsers.add_parser('invert', help='Same arguments as vox12invert.py.')
+    invert.add_argument('input_file')
+    invert.add_argument('arguments', nargs='*')
+    invert.add_argument('--track')
+    add_chart_arguments(invert)
+    invert.set_defaults(run=run_invert)
+
+    ksh = subparsers.add_parser('ksh', help='Same arguments as vox12tokshcurve.py.')
+    ksh.add_argument('input_file')
+    ksh.add_argument('time_signature', nargs='?')
+    ksh.add_argument('--chart', action='store_true')
+    ksh.add_argument('--track', action='append', dest='tracks')
+    ksh.add_argument('--tolerance', type=float, metavar='VALUE')
+    add_chart_arguments(ksh)
+    ksh.set_defaults(run=run_ksh)
+
+    dydx = subparsers.add_parser('dydx', help='Same arguments as voxfinddydx.py.')
+    dydx.add_argument('control_points', nargs='?', default='control_points.txt')
+    dydx.add_argument('interpolated_points', nargs='?', default='interpolated_points.txt')
+    dydx.add_argument('-t', '--time-signature', default='4/4')
+    dydx.add_argument('-f', '--format', choices=['json', 'csv', 'text'], default='json')
+    dydx.set_defaults(run=run_dydx)
+
+    for name in ('ping', 'shutdown'):
+        subparsers.add_parser(name).set_defaults(run=lambda args: request(args.job, args.socket))
+
+    args = parser.parse_args()
+    try:
+        result = args.run(args)
+    except (ServerError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if isinstance(result, dict) and 'output' in result:
+        print(f"Chart saved as: {result['output']}")
+    elif args.job == 'ping':
+        print(f"voxserver pid {result['pid']}, up {result['uptime']:.0f}s, {result['requests']} request(s) served")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+import argparse
+import functools
+import json
+import sys
+
+import numpy as np
+
+from vox12curve import EASING_FUNCTIONS, ease_values
+from voxdoc import LASER_TRACKS, Track, VoxDocument, parse_range, track_section_name
+from voxerrors import VoxError
+from voxfiles import expand_paths, map_batch
+from voxtimebase import Timebase
+import voxbinary
+import voxprofile
+
+# Linear first so that near-ties resolve to the simplest curve; the free-slope cubic goes last. cubic_spline is not
+# a candidate of its own: a natural spline is a piecewise cubic with matching slopes at its nodes, so its points are
+# recovered exactly as chained cubic_hermite segments whose dy/dx regenerate it.
+CANDIDATE_TYPES = ['sharp'] + [name for name in EASING_FUNCTIONS if name != 'sharp'] + ['cubic_hermite']
+
+# Generated curves come back exactly at this tolerance; loosen it to approximate with fewer segments
+DEFAULT_TOLERANCE = 1e-5
+
+# Every end this close to the anchor is tried; farther ends are only tried at knots
+NEAR_WINDOW = 16
+MAX_WINDOW = 1024
+MAX_KNOTS = 24
+
+# A third difference this many times the smallest one around it marks a join between two curves
+KNOT_RATIO = 4
+KNOT_WINDOW = 3
+
+# Values are written with six decimals, so smaller differences between fits are noise
+PRECISION = 1e-6
+
+def segment_points(starts, ends):
+    counts = ends - starts + 1
+    offsets = np.cumsum(counts) - counts
+    segment_ids = np.repeat(np.arange(len(counts)), counts)
+    index = starts[segment_ids] + np.arange(counts.sum()) - offsets[segment_ids]
+    return index, segment_ids, offsets
+
+def hermite_fit(ratio, y, v0, v1, segment_ids, offsets, fixed_m0=None):
+    # Endpoints are fixed; the end tangents (per unit of ratio) are solved by least squares per segment. Where
+    # fixed_m0 is finite the start tangent is given and only the end tangent is solved.
+    h00 = 2 * ratio**3 - 3 * ratio**2 + 1
+    h01 = -2 * ratio**3 + 3 * ratio**2
+    h10 = ratio**3 - 2 * ratio**2 + ratio
+    h11 = ratio**3 - ratio**2
+    target = y - h00 * v0 - h01 * v1
+
+    saa = np.add.reduceat(h10 * h10, offsets)
+    sab = np.add.reduceat(h10 * h11, offsets)
+    sbb = np.add.reduceat(h11 * h11, offsets)
+    sat = np.add.reduceat(h10 * target, offsets)
+    sbt = np.add.reduceat(h11 * target, offsets)
+    det = saa * sbb - sab * sab
+
+    solvable = det > 1e-12
+    safe_det = np.where(solvable, det, 1.0)
+    m0 = np.where(solvable, (sbb * sat - sab * sbt) / safe_det, 0.0)
+    m1 = np.where(solvable, (saa * sbt - sab * sat) / safe_det, 0.0)
+
+    if fixed_m0 is not None:
+        fixed = np.isfinite(fixed_m0)
+        m0 = np.where(fixed, fixed_m0, m0)
+        m1 = np.where(fixed, np.where(sbb > 1e-12, (sbt - sab * m0) / np.where(sbb > 1e-12, sbb, 1.0), 0.0), m1)
+    predicted = h00 * v0 + h01 * v1 + h10 * m0[segment_ids] + h11 * m1[segment_ids]
+    return predicted, m0, m1
+
+def fit_segments(ticks, values, starts, ends, candidates=CANDIDATE_TYPES, start_slopes=None):
+    # start_slopes (per tick, NaN where free) continues the cubic_hermite run a segment starts in
+    index, segment_ids, offsets = segment_points(starts, ends)
+    ratio = (ticks[index] - ticks[starts][segment_ids]) / (ticks[ends] - ticks[starts])[segment_ids]
+    y = values[index]
+    v0 = values[starts][segment_ids]
+    v1 = values[ends][segment_ids]
+
+    # Curves cover [start, end) and the end row is the next control point, which an easing need not reach
+    at_end = index == ends[segment_ids]
+
+    # One pass per candidate over every point of every candidate segment
+    errors = np.empty((len(candidates), len(starts)))
+    slopes = None
+    with np.errstate(all='ignore'):
+        for i, interpolation_type in enumerate(candidates):
+            if interpolation_type == 'cubic_hermite':
+                span = ticks[ends] - ticks[starts]
+                fixed_m0 = None if start_slopes is None else start_slopes * span
+                predicted, m0, m1 = hermite_fit(ratio, y, v0, v1, segment_ids, offsets, fixed_m0)
+                slopes = np.stack([m0, m1], axis=1) / span[:, None]
+            else:
+                predicted = ease_values(ratio, v0, v1, interpolation_type)
+            residual = np.abs(predicted - y)
+            residual[at_end] = 0.0
+            residual[~np.isfinite(residual)] = np.inf
+            errors[i] = np.maximum.reduceat(residual, offsets)
+
+    # The first candidate within PRECISION of the best fit wins
+    best_error = errors.min(axis=0)
+    choice = np.argmax(errors <= best_error + PRECISION, axis=0)
+    chosen = np.array([candidates[i] for i in choice.tolist()], dtype=object)
+
+    if slopes is None:
+        slopes = np.zeros((len(starts), 2))
+    return chosen, errors[choice, np.arange(len(starts))], slopes
+
+def run_breaks(ticks, laser_starts=None):
+    # Repeated ticks (slams) and the start of every laser split the data into runs
+    breaks = np.flatnonzero(ticks[1:] == ticks[:-1]) + 1
+    if laser_starts is not None:
+        breaks = np.union1d(breaks, np.asarray(laser_starts, dtype=np.int64))
+    return breaks[(breaks > 0) & (breaks < len(ticks))]
+
+def find_knots(ticks, values, breaks):
+    # Joins between generated segments show up as spikes of the third difference, which is smooth inside any
+    # one curve; every point of a spiking stencil is a knot. False knots only cost a few more candidate ends.
+    knots = np.zeros(len(ticks) + 1, dtype=bool)
+    knots[breaks] = knots[breaks - 1] = True
+    knots[[0, -2, -1]] = True
+    if len(ticks) > 3:
+        d3 = np.abs(np.diff(values, 3))
+        padded = np.pad(d3, KNOT_WINDOW, constant_values=np.inf)
+        neighbours = np.lib.stride_tricks.sliding_window_view(padded, 2 * KNOT_WINDOW + 1).min(axis=1)
+        spikes = np.flatnonzero(d3 > KNOT_RATIO * neighbours + 8 * PRECISION)
+        for shift in range(4):
+            knots[spikes + shift] = True
+    # A change of point spacing starts a new grid and so a new curve
+    spacing = np.diff(ticks)
+    knots[np.flatnonzero(spacing[1:] != spacing[:-1]) + 1] = True
+    return np.flatnonzero(knots[:-1])
+
+def candidate_ends(anchors, run_ends, knots):
+    # Every point up to NEAR_WINDOW past the anchor, then up to MAX_KNOTS knots within MAX_WINDOW, ascending
+    near_ends = np.minimum(run_ends, anchors + NEAR_WINDOW)
+    near_counts = near_ends - anchors
+    knot_lo = np.searchsorted(knots, near_ends, side='right')
+    knot_hi = np.searchsorted(knots, np.minimum(run_ends, anchors + MAX_WINDOW), side='right')
+    knot_counts = np.minimum(knot_hi, knot_lo + MAX_KNOTS) - knot_lo
+
+    counts = near_counts + knot_counts
+    offsets = np.cumsum(counts) - counts
+    pair_runs = np.repeat(np.arange(len(anchors)), counts)
+    position = np.arange(counts.sum()) - offsets[pair_runs]
+    near = position < near_counts[pair_runs]
+    knot_index = np.clip(knot_lo[pair_runs] + position - near_counts[pair_runs], 0, len(knots) - 1)
+    pair_ends = np.where(near, anchors[pair_runs] + 1 + position, knots[knot_index])
+    return pair_runs, pair_ends, offsets
+
+def detect(ticks, values, tolerance=DEFAULT_TOLERANCE, candidates=CANDIDATE_TYPES, laser_starts=None):
+    ticks = np.asarray(ticks, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+
+    breaks = run_breaks(ticks, laser_starts)
+    run_starts = np.concatenate([[0], breaks])
+    run_ends = np.concatenate([breaks, [len(ticks)]]) - 1
+    keep = run_ends > run_starts
+    anchors, run_ends = run_starts[keep], run_ends[keep]
+    knots = find_knots(ticks, values, breaks)
+    # End slope of each run's last segment while it is a cubic_hermite, so that the next one joins it smoothly
+    run_slopes = np.full(len(anchors), np.nan)
+
+    # Greedy: every run extends its current segment to the farthest end some candidate still fits within
+    # tolerance. An easing only fits over its whole extent, so beyond the nearest few points the ends tried are
+    # knots. Each round fits every (anchor, end, candidate) of every run in one batch.
+    segments = []
+    active = np.flatnonzero(anchors < run_ends)
+    while len(active):
+        pair_runs, pair_ends, offsets = candidate_ends(anchors[active], run_ends[active], knots)
+        pair_starts = anchors[active][pair_runs]
+
+        with voxprofile.stage('fit'):
+            chosen, errors, slopes = fit_segments(ticks, values, pair_starts, pair_ends, candidates,
+                                                  run_slopes[active][pair_runs])
+
+        # A two-point segment always fits, so every run advances
+        fits = errors <= tolerance
+        fits[offsets] = True
+        pairs = np.maximum.reduceat(np.where(fits, np.arange(len(fits)), -1), offsets)
+        for pair in pairs.tolist():
+            segments.append((int(pair_starts[pair]), int(pair_ends[pair]), chosen[pair], float(errors[pair]),
+                             float(slopes[pair, 0]), float(slopes[pair, 1])))
+        anchors[active] = pair_ends[pairs]
+        run_slopes[active] = np.where(chosen[pairs] == 'cubic_hermite', slopes[pairs, 1], np.nan)
+        active = active[anchors[active] < run_ends[active]]
+
+    segments.sort()
+    return segments
+
+def control_rows(ticks, segments, laser_starts=None):
+    # Segment end points and both ends of every run, which includes every row of a slam
+    ticks = np.asarray(ticks, dtype=np.int64)
+    rows = np.zeros(len(ticks), dtype=bool)
+    if not len(ticks):
+        return np.flatnonzero(rows)
+    breaks = run_breaks(ticks, laser_starts)
+    rows[[0, -1]] = True
+    rows[breaks] = rows[breaks - 1] = True
+    for start, end, *_ in segments:
+        rows[start] = rows[end] = True
+    return np.flatnonzero(rows)
+
+def hermite_dydx(segments):
+    # Slopes are per tick, as vox12curve takes them; consecutive cubic_hermite segments already share their slope
+    dydx = {}
+    for start, end, interpolation_type, _, m0, m1 in segments:
+        if interpolation_type == 'cubic_hermite':
+            dydx.setdefault(start, []).append(m0)
+            dydx.setdefault(end, []).append(m1)
+    return {row: float(np.mean(slopes)) for row, slopes in dydx.items()}
+
+def detect_track(track, start_tick=None, end_tick=None, tolerance=DEFAULT_TOLERANCE, candidates=CANDIDATE_TYPES):
+    lo, hi = track.index_range(start_tick, end_tick)
+    laser_starts = [laser_lo - lo for laser_lo, _ in track.laser_ranges(lo, hi)]
+    segments = detect(track.ticks[lo:hi], track.values[lo:hi], tolerance, candidates, laser_starts)
+    rows = control_rows(track.ticks[lo:hi], segments, laser_starts) + lo
+    return lo, hi, [(start + lo, end + lo, *rest) for start, end, *rest in segments], rows
+
+def track_report(track, lo, hi, segments, rows):
+    timebase = track.timebase
+    ticks = track.ticks.tolist()
+    values = track.values.tolist()
+    dydx = hermite_dydx(segments)
+    return {
+        'points': hi - lo,
+        'control_points': len(rows),
+        'max_error': max((error for _, _, _, error, _, _ in segments), default=0.0),
+        'segments': {timebase.format(ticks[start]): interpolation_type for start, _, interpolation_type, *_ in segments},
+        'dydx': {'points': [{'mbt': timebase.format(ticks[row]), 'tick': ticks[row], 'value': values[row], 'dydx': slope}
+                            for row, slope in sorted(dydx.items())]},
+    }
+
+def reduce_track(track, lo, hi, rows):
+    # Keep only the control points, ready to be regenerated with vox12curve --segments
+    track.replace_rows(lo, hi, track.ticks[rows], track.values[rows], track.flags[rows])
+
+def load_input(file_path, time_signature):
+    if file_path.endswith(('.vox', voxbinary.SUFFIX)):
+        return VoxDocument.load(file_path), None
+    with open(file_path, 'r') as file:
+        return None, Track.parse('SNIPPET', Timebase.from_spec(time_signature), file.readlines())
+
+def detect_file(file_path, time_signature='4/4', track_names=None, ranges=None, tolerance=DEFAULT_TOLERANCE,
+                candidates=CANDIDATE_TYPES, reduce=False):
+    document, snippet = load_input(file_path, time_signature)
+    if document is None:
+        tracks = [snippet]
+    else:
+        names = track_names or [name for name in LASER_TRACKS if name in document.sections]
+        tracks = [document.track(name) for name in names]
+
+    report = {}
+    for track in tracks:
+        track_reports = []
+        for text in ranges or ['-']:
+            start_tick, end_tick = parse_range(track.timebase, text)
+            lo, hi, segments, rows = detect_track(track, start_tick, end_tick, tolerance, candidates)
+            track_reports.append(track_report(track, lo, hi, segments, rows))
+            if reduce:
+                reduce_track(track, lo, hi, rows)
+        report[track.name] = merge_reports(track_reports)
+    return report, document, tracks
+
+def merge_reports(reports):
+    merged = {'points': 0, 'control_points': 0, 'max_error': 0.0, 'segments': {}, 'dydx': {'points': []}}
+    for report in reports:
+        merged['points'] += report['points']
+        merged['control_points'] += report['control_points']
+        merged['max_error'] = max(merged['max_error'], report['max_error'])
+        merged['segments'].update(report['segments'])
+        merged['dydx']['points'].extend(report['dydx']['points'])
+    return merged
+
+def detect_one(file_path, **options):
+    try:
+        return file_path, detect_file(file_path, **options)[0], None
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}"
+
+def detect_batch(file_paths, workers=None, **options):
+    return map_batch(functools.partial(detect_one, **options), file_paths, workers)
+
+def write_json(data, file_path):
+    if file_path == '-':
+        json.dump(data, sys.stdout, indent=2)
+        print()
+        return
+    with open(file_path, 'w') as file:
+        json.dump(data, file, indent=2)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Detect the easing type of every laser segment from dense points.')
+    parser.add_argument('paths', nargs='+', help='Charts (.vox), laser snippets, directories or glob patterns.')
+    parser.add_argument('-t', '--time-signature', default='4/4', help='Time signature of snippets, e.g. "4/4".')
+    parser.add_argument('--track', action='append', dest='tracks', help='Track to analyse (default: both lasers).')
+    parser.add_argument('--range', action='append', dest='ranges', metavar='START-END', help='Tick range to analyse.')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'Largest value error a detected segment may have (default: {DEFAULT_TOLERANCE}).')
+    parser.add_argument('--types', help='Comma-separated candidate types (default: every easing type and cubic_hermite, '
+                                        'which also stands in for cubic_spline).')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes for several inputs.')
+    parser.add_argument('--json', metavar='FILE', help='Write the full report as JSON ("-" for stdout).')
+    parser.add_argument('--spec', metavar='FILE', help='Write the --segments spec of the single input track ("-" for stdout).')
+    parser.add_argument('--dydx', metavar='FILE', help='Write the cubic_hermite dy/dx of the single input track for --dydx.')
+    parser.add_argument('-o', '--output', help='Write the input with only the detected control points kept.')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+
+    candidates = CANDIDATE_TYPES
+    if args.types:
+        candidates = [name.strip().lower() for name in args.types.split(',') if name.strip()]
+        unknown = [name for name in candidates if name not in CANDIDATE_TYPES]
+        if unknown:
+            parser.error(f"unknown candidate type(s): {', '.join(unknown)}")
+    tracks = [track_section_name(track) for track in args.tracks] if args.tracks else None
+    options = dict(time_signature=args.time_signature, track_names=tracks, ranges=args.ranges,
+                   tolerance=args.tolerance, candidates=candidates)
+
+    file_paths = expand_paths(args.paths)
+    if not file_paths:
+        print("Error: No input files found.")
+        sys.exit(1)
+
+    if args.spec or args.dydx or args.output:
+        if len(file_paths) != 1:
+            parser.error("--spec, --dydx and --output need a single input")
+        try:
+            report, document, detected_tracks = detect_file(file_paths[0], reduce=bool(args.output), **options)
+        except (VoxError, KeyError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if len(report) != 1 and (args.spec or args.dydx):
+            parser.error("--spec and --dydx need a single --track")
+        only_track = next(iter(report.values()))
+        if args.spec:
+            write_json(only_track['segments'], args.spec)
+        if args.dydx:
+            write_json(only_track['dydx'], args.dydx)
+        if args.output:
+            if document is not None:
+                document.save(args.output)
+            else:
+                with open(args.output, 'w') as file:
+                    file.writelines(detected_tracks[0].lines())
+        results = [(file_paths[0], report, None)]
+    else:
+        results = detect_batch(file_paths, args.workers, **options)
+
+    full_report = {}
+    failed = 0
+    for file_path, report, error in results:
+        if error is not None:
+            failed += 1
+            print(f"FAILED  {file_path}: {error}", file=sys.stderr)
+            continue
+        full_report[file_path] = report
+        if args.json != '-' and args.spec != '-' and args.dydx != '-':
+            for name, track in report.items():
+                print(f"{file_path} {name}: {track['points']} points -> {track['control_points']} control points, "
+                      f"{len(track['segments'])} segments, max error {track['max_error']:.6f}")
+
+    if args.json:
+        write_json(full_report, args.json)
+    if failed:
+        sys.exit(1)
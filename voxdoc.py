@@ -0,0 +1,251 @@
+import numpy as np
+
+from voxtimebase import Timebase
+import voxbinary
+import voxprofile
+
+LASER_TRACKS = ('TRACK1', 'TRACK8')
+
+def track_section_name(track):
+    track = str(track).strip().lstrip('#').upper()
+    if track.isdigit():
+        return f"TRACK{track}"
+    return track
+
+def format_rows(timebase, ticks, values, flags):
+    lines = []
+    for tick_string, value, row_flags in zip(timebase.format_column(ticks), np.asarray(values).tolist(), flags):
+        row_flags = [flag for flag in row_flags if flag != '']
+        lines.append('\t'.join([tick_string, f"{value:.6f}"] + row_flags) + '\n')
+    return lines
+
+def parse_range(timebase, text):
+    start, _, end = text.partition('-')
+    start_tick = timebase.parse(start.strip()) if start.strip() else None
+    end_tick = timebase.parse(end.strip()) if end.strip() else None
+    return start_tick, end_tick
+
+def pad_flags(rows):
+    width = max((len(row) for row in rows), default=0)
+    flags = np.full((len(rows), width), '', dtype=object)
+    for i, row in enumerate(rows):
+        flags[i, :len(row)] = row
+    return flags
+
+class Track:
+    def __init__(self, name, timebase, ticks, values, flags, lines=None):
+        self.name = name
+        self.timebase = timebase
+        self.ticks = np.asarray(ticks, dtype=np.int64)
+        self.values = np.asarray(values, dtype=float)
+        self.flags = flags if isinstance(flags, np.ndarray) else pad_flags(flags)
+        self._lines = lines
+
+    @classmethod
+    def parse(cls, name, timebase, lines):
+        lines = [line if line.endswith('\n') else line + '\n' for line in lines if line[:1].isdigit()]
+        rows = [line.rstrip('\r\n').split('\t') for line in lines]
+        ticks = timebase.parse_column(row[0] for row in rows)
+        values = np.array([float(row[1]) for row in rows], dtype=float)
+        return cls(name, timebase, ticks, values, [row[2:] for row in rows], lines)
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def index_range(self, start_tick=None, end_tick=None):
+        lo = 0 if start_tick is None else int(np.searchsorted(self.ticks, start_tick, side='left'))
+        hi = len(self.ticks) if end_tick is None else int(np.searchsorted(self.ticks, end_tick, side='right'))
+        return lo, hi
+
+    def laser_ranges(self, lo=0, hi=None):
+        # Lasers run up to and including a row whose node type (first flag) is 2
+        hi = len(self.ticks) if hi is None else hi
+        if lo >= hi:
+            return []
+        node_types = self.flags[lo:hi, 0] if self.flags.shape[1] else np.full(hi - lo, '', dtype=object)
+        ends = np.flatnonzero(node_types == '2') + lo + 1
+        bounds = [lo] + [end for end in ends.tolist() if end < hi] + [hi]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def row_flags(self, index):
+        return [flag for flag in self.flags[index] if flag != '']
+
+    def replace_rows(self, lo, hi, ticks, values, flags):
+        with voxprofile.stage('format'):
+            self._replace_rows(lo, hi, ticks, values, flags)
+
+    def _replace_rows(self, lo, hi, ticks, values, flags):
+        ticks = np.asarray(ticks, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        flags = flags if isinstance(flags, np.ndarray) else pad_flags(flags)
+
+        width = max(self.flags.shape[1], flags.shape[1])
+        merged_flags = np.full((len(self.ticks) - (hi - lo) + len(ticks), width), '', dtype=object)
+        merged_flags[:lo, :self.flags.shape[1]] = self.flags[:lo]
+        merged_flags[lo:lo + len(ticks), :flags.shape[1]] = flags
+        merged_flags[lo + len(ticks):, :self.flags.shape[1]] = self.flags[hi:]
+
+        if self._lines is not None:
+            self._lines[lo:hi] = format_rows(self.timebase, ticks, values, flags)
+        self.ticks = np.concatenate([self.ticks[:lo], ticks, self.ticks[hi:]])
+        self.values = np.concatenate([self.values[:lo], values, self.values[hi:]])
+        self.flags = merged_flags
+
+        if np.any(np.diff(self.ticks) < 0):
+            order = np.argsort(self.ticks, kind='stable')
+            self.ticks = self.ticks[order]
+            self.values = self.values[order]
+            self.flags = self.flags[order]
+            if self._lines is not None:
+                self._lines = [self._lines[i] for i in order.tolist()]
+
+    def invalidate(self):
+        self._lines = None
+
+    def lines(self):
+        if self._lines is None:
+            self._lines = format_rows(self.timebase, self.ticks, self.values, self.flags)
+        return self._lines
+
+class Section:
+    def __init__(self, name, header, lines, end):
+        self.name = name
+        self.header = header
+        self.lines = lines
+        self.end = end
+        self.track = None
+
+    def body(self):
+        if self.track is not None:
+            return self.track.lines()
+        return self.lines
+
+class VoxDocument:
+    def __init__(self, items):
+        self.items = items
+        self.sections = {item.name: item for item in items if isinstance(item, Section)}
+        beat_info = self.sections.get('BEAT INFO')
+        self.timebase = Timebase.from_beat_info(beat_info.lines if beat_info else [])
+
+    @classmethod
+    def parse(cls, lines):
+        items = []
+        section = None
+        for line in lines:
+            stripped = line.strip()
+            if section is None:
+                if stripped.startswith('#') and stripped != '#END':
+                    section = Section(stripped[1:], line, [], None)
+                    items.append(section)
+                else:
+                    items.append(line)
+            elif stripped == '#END':
+                section.end = line
+                section = None
+            else:
+                section.lines.append(line)
+        return cls(items)
+
+    @classmethod
+    def load(cls, file_path, mmap=True):
+        if voxbinary.is_binary(file_path):
+            return cls.load_binary(file_path, mmap)
+        with voxprofile.stage('read'):
+            with open(file_path, 'r') as file:
+                return cls.parse(file)
+
+    @classmethod
+    def load_binary(cls, file_path, mmap=True):
+        # Track arrays are mapped from the file rather than parsed; flags are codes into a small vocabulary
+        with voxprofile.stage('read'):
+            meta, arrays = voxbinary.read(file_path, mmap)
+            items = []
+            for item in meta['items']:
+                if 'text' in item:
+                    items.append(item['text'])
+                else:
+                    items.append(Section(item['name'], item['header'], item.get('lines', []), item['end']))
+            document = cls(items)
+
+            for item in meta['items']:
+                if 'track' in item:
+                    name = item['name']
+                    vocabulary = np.array(item['track']['vocabulary'] or [''], dtype=object)
+                    document.sections[name].track = Track(name, document.timebase, arrays[f"{name}/ticks"],
+                                                          arrays[f"{name}/values"], vocabulary[arrays[f"{name}/flags"]])
+        return document
+
+    def binary_tracks(self):
+        # Tracks a tool has parsed are stored as arrays, and so are lasers whose rows come back unchanged from them;
+        # every other section stays text
+        names = []
+        for name, section in self.sections.items():
+            if section.track is None and name in LASER_TRACKS:
+                try:
+                    track = Track.parse(name, self.timebase, section.lines)
+                except (ValueError, IndexError):
+                    continue
+                if format_rows(self.timebase, track.ticks, track.values, track.flags) != section.lines:
+                    continue
+                section.track = track
+            if section.track is not None:
+                names.append(name)
+        return names
+
+    def track(self, name):
+        section = self.sections[track_section_name(name)]
+        if section.track is None:
+            with voxprofile.stage('parse'):
+                section.track = Track.parse(section.name, self.timebase, section.lines)
+        return section.track
+
+    def tracks(self):
+        return [name for name in self.sections if name.startswith('TRACK') and name[5:].isdigit()]
+
+    def parse_range(self, text):
+        return parse_range(self.timebase, text)
+
+    def iter_lines(self):
+        for item in self.items:
+            if isinstance(item, Section):
+                yield item.header
+                yield from item.body()
+                if item.end is not None:
+                    yield item.end
+            else:
+                yield item
+
+    def dumps(self):
+        return ''.join(self.iter_lines())
+
+    def save(self, file_path):
+        if file_path.endswith(voxbinary.SUFFIX):
+            self.save_binary(file_path)
+            return
+        with voxprofile.stage('write'):
+            with open(file_path, 'w') as file:
+                file.writelines(self.iter_lines())
+
+    def save_binary(self, file_path):
+        binary_tracks = set(self.binary_tracks())
+        items = []
+        arrays = {}
+        for item in self.items:
+            if not isinstance(item, Section):
+                items.append({'text': item})
+                continue
+            entry = {'name': item.name, 'header': item.header, 'end': item.end}
+            if item.name in binary_tracks:
+                track = self.track(item.name)
+                vocabulary, codes = np.unique(track.flags.astype(str), return_inverse=True)
+                entry['track'] = {'vocabulary': vocabulary.tolist()}
+                arrays[f"{item.name}/ticks"] = track.ticks
+                arrays[f"{item.name}/values"] = track.values
+                arrays[f"{item.name}/flags"] = codes.reshape(track.flags.shape).astype(
+                    np.uint8 if len(vocabulary) <= 256 else np.int32)
+            else:
+                entry['lines'] = item.lines
+            items.append(entry)
+
+        with voxprofile.stage('write'):
+            voxbinary.write(file_path, {'items': items}, arrays)
@@ -0,0 +1,2 @@
+class VoxError(ValueError):
+    pass
@@ -0,0 +1,90 @@
+import contextlib
+import functools
+import glob
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import voxprofile
+
+# Path, atomic-write and batch helpers shared by the command line tools
+
+# Read once at import; os.umask can only be read by setting it, which is not safe once server threads run
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+def output_path_for(file_path, suffix):
+    # chart.vox -> chart<suffix>.vox; only the extension is split off, so an input is never its own output
+    root, ext = os.path.splitext(file_path)
+    return root + suffix + ext
+
+def same_file(file_path, output_path):
+    return '-' not in (file_path, output_path) and os.path.realpath(file_path) == os.path.realpath(output_path)
+
+def expand_paths(patterns):
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = []
+            for root, _, files in os.walk(pattern):
+                for name in files:
+                    if name.endswith('.vox') and not name.endswith('_processed.vox'):
+                        matches.append(os.path.join(root, name))
+            matches.sort()
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+
+    return paths
+
+@contextlib.contextmanager
+def atomic_open(file_path, mode='w'):
+    # Written next to the target and renamed into place, so readers of file_path never see a partial file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix='.tmp')
+    try:
+        # mkstemp creates the file 0600; the result gets the mode it replaces, or the one open() would give it
+        try:
+            file_mode = os.stat(file_path).st_mode & 0o7777
+        except FileNotFoundError:
+            file_mode = 0o666 & ~UMASK
+        with os.fdopen(fd, mode) as file:
+            os.chmod(file.fileno(), file_mode)
+            yield file
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def run_profiled(function, file_path, memory=True, cprofile_stage=None):
+    profiler = voxprofile.enable(memory, cprofile_stage)
+    result = function(file_path)
+    return result, profiler.to_dict(), profiler.dump_cprofile()
+
+def map_batch(function, file_paths, workers=None):
+    # Yields function(file_path) in order, from worker processes unless there is one worker or one file. function
+    # must be picklable, e.g. a module-level function or a functools.partial of one.
+    if workers == 1 or len(file_paths) < 2:
+        yield from map(function, file_paths)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        profiler = voxprofile.PROFILER
+        if not profiler.enabled:
+            yield from executor.map(function, file_paths, chunksize=chunksize)
+            return
+
+        # Each worker profiles its own files; the stage totals and cProfile stats are merged here
+        profiled = functools.partial(run_profiled, function, memory=profiler.memory,
+                                     cprofile_stage=profiler.cprofile_stage)
+        for result, stages, cprofile_path in executor.map(profiled, file_paths, chunksize=chunksize):
+            profiler.merge(stages)
+            if cprofile_path is not None:
+                profiler.merge_cprofile(cprofile_path)
+            yield result
@@ -1,19 +1,30 @@
+import argparse
+import csv
+import json
+import sys
+
 import numpy as np
 
-def mbt_to_numerical_updated(mbt, beats_per_measure, ticks_per_beat):
-    measures, beats, ticks = map(int, mbt.split(","))
-    return ((measures - 1) * beats_per_measure * ticks_per_beat) + ((beats - 1) * ticks_per_beat) + ticks
+from voxerrors import VoxError
+from voxtimebase import Timebase
+import voxprofile
 
-def parse_data(file_path, beats_per_measure, ticks_per_beat):
+def parse_lines(lines, timebase):
     parsed_data = []
-    with open(file_path, 'r') as file:
-        for line in file:
+    with voxprofile.stage('parse'):
+        for line in lines:
             parts = line.strip().split("\t")
+            if len(parts) < 2:
+                continue
             mbt, float_val = parts[0], float(parts[1]) 
-            numerical_mbt = mbt_to_numerical_updated(mbt, beats_per_measure, ticks_per_beat)
+            numerical_mbt = timebase.parse(mbt)
             parsed_data.append((numerical_mbt, float_val))
     return parsed_data
 
+def parse_data(file_path, timebase):
+    with (sys.stdin if file_path == '-' else open(file_path, 'r')) as file:
+        return parse_lines(file, timebase)
+
 
 def normalize_mbt(numerical_mbt, min_mbt, max_mbt):
     return (numerical_mbt - min_mbt) / (max_mbt - min_mbt)
@@ -21,41 +32,125 @@ def normalize_mbt(numerical_mbt, min_mbt, max_mbt):
 def replace_mbt_with_normalized(data, min_mbt, max_mbt):
     return [(normalize_mbt(mbt, min_mbt, max_mbt), float_val) for mbt, float_val in data]
 
-def find_cubic_polynomials_and_derivatives(control_points, interpolated_points):
-    x_values = [point[0] for point in interpolated_points]
-    y_values = [point[1] for point in interpolated_points]
-
-    for i in range(len(control_points) - 1):
-        start_x = control_points[i][0]
-        end_x = control_points[i+1][0]
-        segment_x = [x for x in x_values if start_x <= x <= end_x]
-        segment_y = [y for x, y in zip(x_values, y_values) if start_x <= x <= end_x]
-
-        coefficients = np.polyfit(segment_x, segment_y, 3)
-        poly = np.poly1d(coefficients)
-        print(f"Segment {i+1} Polynomial: {poly}")
-
-        poly_deriv = poly.deriv()
-
-        dydx_start = poly_deriv(start_x)
-        dydx_end = poly_deriv(end_x)
-        print(f"Segment {i+1} dy/dx at {start_x}: {dydx_start:.10f}")
-        print(f"Segment {i+1} dy/dx at {end_x}: {dydx_end:.10f}")
-
-def main():
-    beats_per_measure = 4
-    ticks_per_beat = 48
-
-    control_points = parse_data('control_points.txt', beats_per_measure, ticks_per_beat)
-    interpolated_points = parse_data('interpolated_points.txt', beats_per_measure, ticks_per_beat)
+def fit_cubic_segments(control_x, x_values, y_values):
+    control_x = np.asarray(control_x, dtype=float)
+    order = np.argsort(x_values, kind='stable')
+    x_values = np.asarray(x_values, dtype=float)[order]
+    y_values = np.asarray(y_values, dtype=float)[order]
+
+    # Points on a control point belong to both neighbouring segments, as before
+    lo = np.searchsorted(x_values, control_x[:-1], side='left')
+    hi = np.searchsorted(x_values, control_x[1:], side='right')
+    counts = hi - lo
+    if len(counts) == 0 or counts.min() == 0:
+        raise VoxError("Every segment needs at least one interpolated point.")
+
+    index = lo[:, None] + np.arange(counts.max())[None, :]
+    mask = index < hi[:, None]
+    index = np.minimum(index, len(x_values) - 1)
+    segment_x = np.where(mask, x_values[index], 0.0)
+    segment_y = np.where(mask, y_values[index], 0.0)
+
+    # One padded Vandermonde stack for all segments, column-scaled like np.polyfit
+    vandermonde = segment_x[..., None] ** np.arange(3, -1, -1) * mask[..., None]
+    scale = np.sqrt((vandermonde * vandermonde).sum(axis=1))
+    scale[scale == 0] = 1.0
+    rcond = counts * np.finfo(float).eps
+    coefficients = (np.linalg.pinv(vandermonde / scale[:, None, :], rcond=rcond) @ segment_y[..., None])[..., 0]
+    return coefficients / scale
+
+def derivatives(coefficients, x_values):
+    a, b, c = coefficients[:, 0], coefficients[:, 1], coefficients[:, 2]
+    return 3 * a * x_values**2 + 2 * b * x_values + c
 
+def find_cubic_polynomials_and_derivatives(control_points, interpolated_points):
+    control_x = np.array([point[0] for point in control_points])
+    coefficients = fit_cubic_segments(control_x, [point[0] for point in interpolated_points],
+                                      [point[1] for point in interpolated_points])
+    dydx_start = derivatives(coefficients, control_x[:-1])
+    dydx_end = derivatives(coefficients, control_x[1:])
+    return coefficients, dydx_start, dydx_end
+
+def point_derivatives(dydx_start, dydx_end):
+    # Interior control points get the mean of the two one-sided estimates
+    dydx = np.empty(len(dydx_start) + 1)
+    dydx[0] = dydx_start[0]
+    dydx[-1] = dydx_end[-1]
+    dydx[1:-1] = (dydx_end[:-1] + dydx_start[1:]) / 2
+    return dydx
+
+def build_results(control_points, interpolated_points, timebase):
     all_numerical_mbts = [mbt for mbt, _ in control_points + interpolated_points]
     min_mbt, max_mbt = min(all_numerical_mbts), max(all_numerical_mbts)
 
     normalized_control_points = replace_mbt_with_normalized(control_points, min_mbt, max_mbt)
     normalized_interpolated_points = replace_mbt_with_normalized(interpolated_points, min_mbt, max_mbt)
 
-    find_cubic_polynomials_and_derivatives(normalized_control_points, normalized_interpolated_points)
+    with voxprofile.stage('fit'):
+        coefficients, dydx_start, dydx_end = find_cubic_polynomials_and_derivatives(
+            normalized_control_points, normalized_interpolated_points)
+        dydx = point_derivatives(dydx_start, dydx_end)
+
+    segments = []
+    for i in range(len(control_points) - 1):
+        segments.append({
+            'segment': i + 1,
+            'start': timebase.format(control_points[i][0]),
+            'end': timebase.format(control_points[i + 1][0]),
+            'start_tick': control_points[i][0],
+            'end_tick': control_points[i + 1][0],
+            'coefficients': coefficients[i].tolist(),
+            'dydx_start': float(dydx_start[i]),
+            'dydx_end': float(dydx_end[i]),
+        })
+
+    points = [{'mbt': timebase.format(tick), 'tick': tick, 'value': value, 'dydx': float(point_dydx)}
+              for (tick, value), point_dydx in zip(control_points, dydx)]
+
+    return {'min_tick': min_mbt, 'max_tick': max_mbt, 'segments': segments, 'points': points}
+
+def write_results(results, output_format, file=sys.stdout):
+    if output_format == 'json':
+        json.dump(results, file, indent=2)
+        file.write('\n')
+    elif output_format == 'csv':
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(['segment', 'start', 'end', 'start_tick', 'end_tick', 'dydx_start', 'dydx_end', 'a', 'b', 'c', 'd'])
+        for segment in results['segments']:
+            writer.writerow([segment['segment'], segment['start'], segment['end'], segment['start_tick'],
+                             segment['end_tick'], f"{segment['dydx_start']:.10f}", f"{segment['dydx_end']:.10f}"]
+                            + [repr(c) for c in segment['coefficients']])
+    else:
+        for segment in results['segments']:
+            i = segment['segment']
+            print(f"Segment {i} Polynomial: {np.poly1d(segment['coefficients'])}", file=file)
+            print(f"Segment {i} dy/dx at {segment['start']}: {segment['dydx_start']:.10f}", file=file)
+            print(f"Segment {i} dy/dx at {segment['end']}: {segment['dydx_end']:.10f}", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit a cubic to every segment between control points and report dy/dx.')
+    parser.add_argument('control_points', nargs='?', default='control_points.txt', help='Control point rows.')
+    parser.add_argument('interpolated_points', nargs='?', default='interpolated_points.txt',
+                        help='Dense rows to fit, "-" for stdin.')
+    parser.add_argument('-t', '--time-signature', default='4/4',
+                        help='Time signature such as "4/4", or a .vox chart to read the beat info from.')
+    parser.add_argument('-f', '--format', choices=['json', 'csv', 'text'], default='json', help='Output format.')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+
+    timebase = Timebase.from_spec(args.time_signature)
+
+    control_points = parse_data(args.control_points, timebase)
+    interpolated_points = parse_data(args.interpolated_points, timebase)
+
+    try:
+        results = build_results(control_points, interpolated_points, timebase)
+    except VoxError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    with voxprofile.stage('write'):
+        write_results(results, args.format)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+from voxdoc import VoxDocument
+from voxerrors import VoxError
+from voxfiles import expand_paths
+import voxbinary
+import voxprofile
+
+def packed_path(file_path):
+    # chart.vox <-> chart.voxb
+    if file_path.endswith(voxbinary.SUFFIX):
+        return file_path[:-len(voxbinary.SUFFIX)] + '.vox'
+    if file_path.endswith('.vox'):
+        return file_path[:-len('.vox')] + voxbinary.SUFFIX
+    return file_path + voxbinary.SUFFIX
+
+def convert(file_path, output_path=None):
+    document = VoxDocument.load(file_path)
+    output_path = output_path or packed_path(file_path)
+    document.save(output_path)
+    return output_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack .vox charts into memory-mappable .voxb files, or unpack them.')
+    parser.add_argument('paths', nargs='+', help='Charts (.vox or .voxb) or glob patterns.')
+    parser.add_argument('-o', '--output', help='Output path for a single input; its suffix picks the format.')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+
+    file_paths = expand_paths(args.paths)
+    if args.output is not None and len(file_paths) != 1:
+        parser.error("--output can only be used with a single input")
+
+    failed = 0
+    for file_path in file_paths:
+        try:
+            print(f"OK      {file_path} -> {convert(file_path, args.output)}")
+        except (OSError, VoxError) as e:
+            failed += 1
+            print(f"FAILED  {file_path}: {e}")
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,155 @@
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_DISABLED = contextlib.nullcontext()
+
+class Profiler:
+    def __init__(self, enabled=True, memory=True, cprofile_stage=None):
+        self.enabled = enabled
+        self.memory = memory
+        self.cprofile_stage = cprofile_stage
+        self.stages = {}
+        self.cprofile = cProfile.Profile() if cprofile_stage else None
+        self.cprofile_ran = False
+        self.cprofile_stats = None
+        self._stack = []
+
+    def stage(self, name):
+        if not self.enabled:
+            return _DISABLED
+        return self._stage(name)
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+        else:
+            current = 0
+        frame = [current, 0]
+        self._stack.append(frame)
+
+        profiling = self.cprofile is not None and name == self.cprofile_stage
+        if profiling:
+            self.cprofile_ran = True
+            self.cprofile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profiling:
+                self.cprofile.disable()
+            self._stack.pop()
+
+            peak_bytes = 0
+            if tracing:
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                peak_bytes = peak - frame[0]
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+
+            self.record(name, seconds, 1, peak_bytes)
+
+    def record(self, name, seconds, calls=1, peak_bytes=0):
+        stats = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0})
+        stats['calls'] += calls
+        stats['seconds'] += seconds
+        stats['peak_bytes'] = max(stats['peak_bytes'], peak_bytes)
+
+    def merge(self, stages):
+        for name, stats in stages.items():
+            self.record(name, stats['seconds'], stats['calls'], stats['peak_bytes'])
+
+    def to_dict(self):
+        return {name: dict(stats) for name, stats in self.stages.items()}
+
+    def report(self, file=sys.stderr):
+        print(f"{'stage':<24} {'calls':>8} {'wall (ms)':>12} {'peak (KiB)':>12}", file=file)
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+            print(f"{name:<24} {stats['calls']:>8} {stats['seconds'] * 1000:>12.2f} {stats['peak_bytes'] / 1024:>12.1f}",
+                  file=file)
+
+    def dump_cprofile(self):
+        # Worker processes hand their cProfile stats to the parent through a temporary file
+        if not self.cprofile_ran:
+            return None
+        fd, file_path = tempfile.mkstemp(suffix='.prof')
+        os.close(fd)
+        self.cprofile.dump_stats(file_path)
+        return file_path
+
+    def merge_cprofile(self, file_path):
+        try:
+            if self.cprofile_stats is None:
+                self.cprofile_stats = pstats.Stats(file_path)
+            else:
+                self.cprofile_stats.add(file_path)
+        finally:
+            os.unlink(file_path)
+
+    def report_cprofile(self, file_path=None, file=sys.stderr, limit=30):
+        if self.cprofile is None:
+            return
+        stats = self.cprofile_stats
+        if self.cprofile_ran:
+            stats = pstats.Stats(self.cprofile) if stats is None else stats.add(self.cprofile)
+        if stats is None:
+            print(f"cProfile: stage '{self.cprofile_stage}' did not run", file=file)
+            return
+        if file_path:
+            stats.dump_stats(file_path)
+        else:
+            stats.stream = file
+            stats.sort_stats('cumulative').print_stats(limit)
+
+PROFILER = Profiler(enabled=False)
+
+def stage(name):
+    return PROFILER.stage(name)
+
+def enable(memory=True, cprofile_stage=None):
+    global PROFILER
+    PROFILER = Profiler(memory=memory, cprofile_stage=cprofile_stage)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return PROFILER
+
+def add_arguments(parser):
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', action='store_true', help='Print wall time, calls and peak memory per stage.')
+    group.add_argument('--profile-json', metavar='FILE', help='Write the per-stage profile as JSON ("-" for stdout).')
+    group.add_argument('--no-profile-memory', dest='profile_memory', action='store_false',
+                       help='Skip peak memory tracking, which slows the run down.')
+    group.add_argument('--cprofile', metavar='STAGE', help='Run cProfile over one stage, e.g. fit or evaluate.')
+    group.add_argument('--cprofile-out', metavar='FILE', help='Save the cProfile stats here instead of printing them.')
+
+def configure(args):
+    if not (args.profile or args.profile_json or args.cprofile):
+        return None
+
+    profiler = enable(args.profile_memory, args.cprofile)
+    atexit.register(finish, profiler, args.profile, args.profile_json, args.cprofile_out)
+    return profiler
+
+def finish(profiler, print_report=True, json_path=None, cprofile_path=None):
+    if print_report:
+        profiler.report()
+    if json_path == '-':
+        json.dump(profiler.to_dict(), sys.stdout, indent=2)
+        print()
+    elif json_path:
+        with open(json_path, 'w') as file:
+            json.dump(profiler.to_dict(), file, indent=2)
+    profiler.report_cprofile(cprofile_path)
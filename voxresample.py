@@ -0,0 +1,52 @@
+import numpy as np
+
+INITIAL_WINDOW = 64
+
+def farthest_reach(ticks, values, anchor, end, tolerance):
+    # Greedy slope window: a line from the anchor to point j stays within tolerance of every point in
+    # between while its slope lies inside the intersection of their tolerance cones
+    window = INITIAL_WINDOW
+    while True:
+        stop = min(end, anchor + 1 + window)
+        dt = (ticks[anchor + 1:stop] - ticks[anchor]).astype(float)
+        dv = values[anchor + 1:stop] - values[anchor]
+        slope = dv / dt
+        lower = np.maximum.accumulate((dv - tolerance) / dt)
+        upper = np.minimum.accumulate((dv + tolerance) / dt)
+
+        reachable = np.ones(len(slope), dtype=bool)
+        reachable[1:] = (lower[:-1] <= slope[1:]) & (slope[1:] <= upper[:-1])
+        closed = np.flatnonzero(lower > upper)
+        if closed.size:
+            reachable[closed[0] + 1:] = False
+        if closed.size or stop == end:
+            return anchor + 1 + int(np.flatnonzero(reachable)[-1])
+        window *= 2
+
+def simplify_mask(ticks, values, tolerance):
+    ticks = np.asarray(ticks, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    keep = np.zeros(len(ticks), dtype=bool)
+    if len(ticks) <= 2:
+        keep[:] = True
+        return keep
+
+    # Repeated ticks (slams) split the curve into runs whose end points are always kept
+    breaks = np.flatnonzero(ticks[1:] == ticks[:-1]) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(ticks)]])
+
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        anchor = start
+        keep[anchor] = True
+        while anchor < end - 1:
+            anchor = farthest_reach(ticks, values, anchor, end, tolerance)
+            keep[anchor] = True
+
+    return keep
+
+def simplify(ticks, values, tolerance):
+    ticks = np.asarray(ticks, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    keep = simplify_mask(ticks, values, tolerance)
+    return ticks[keep], values[keep]
@@ -0,0 +1,196 @@
+import argparse
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import vox12curve
+import vox12invert
+import vox12tokshcurve
+import voxdetect
+import voxfinddydx
+import voxtransform
+from voxclient import default_socket_path
+from voxerrors import VoxError
+from voxtimebase import Timebase
+
+def curve_job(request):
+    interpolation_type = request['type'].lower()
+    if request.get('chart'):
+        if request.get('dydx') == '-':
+            # The server's stdin is not the client's
+            raise VoxError("dy/dx cannot be read from stdin by the server; send a file path.")
+        segments = request.get('segments')
+        vox12curve.check_interpolation_type(interpolation_type, allow_keep=segments is not None)
+        segment_spec = vox12curve.parse_segment_spec(segments) if segments is not None else None
+        output_path = vox12curve.process_chart(request['chart'], interpolation_type, request['track'],
+                                               request.get('ranges'), request.get('output'), segment_spec,
+                                               request.get('step', 3), request.get('dydx'), request.get('tolerance'))
+        return {'output': output_path}
+
+    vox12curve.check_interpolation_type(interpolation_type)
+    timebase = Timebase.from_spec(request.get('time_signature', '4/4'))
+    dydx_by_tick = vox12curve.dydx_from_results(request['dydx'], timebase) if request.get('dydx') else None
+    return {'lines': vox12curve.process_lines(request['lines'], interpolation_type, timebase, dydx_by_tick,
+                                              request.get('tolerance'), request.get('step', 3))}
+
+def invert_job(request):
+    measure_offset = request.get('measure_offset', 0)
+    beat_offset = request.get('beat_offset', 0)
+    if request.get('chart'):
+        output_path = vox12invert.process_chart(request['chart'], request['track'], request.get('ranges'),
+                                                measure_offset, beat_offset, request.get('output'))
+        return {'output': output_path}
+
+    timebase = Timebase.from_spec(request.get('time_signature', '4/4'))
+    return {'lines': vox12invert.process_lines(request['lines'], timebase, measure_offset, beat_offset)}
+
+def transform_job(request):
+    pipeline = voxtransform.Pipeline(request['operations'])
+    if request.get('chart'):
+        output_path = voxtransform.process_chart(request['chart'], request['track'], pipeline, request.get('ranges'),
+                                                 request.get('output'))
+        return {'output': output_path}
+
+    timebase = Timebase.from_spec(request.get('time_signature', '4/4'))
+    return {'lines': list(voxtransform.transform_lines(request['lines'], timebase, pipeline))}
+
+def ksh_job(request):
+    if request.get('chart'):
+        output_path = vox12tokshcurve.process_chart(request['chart'], request.get('tracks'), request.get('ranges'),
+                                                    request.get('output'), request.get('tolerance'))
+        return {'output': output_path}
+
+    timebase = Timebase.from_spec(request.get('time_signature', '4/4'))
+    return {'lines': vox12tokshcurve.process_lines(request['lines'], timebase, request.get('tolerance'))}
+
+def dydx_job(request):
+    timebase = Timebase.from_spec(request.get('time_signature', '4/4'))
+    control_points = voxfinddydx.parse_lines(request['control_lines'], timebase)
+    interpolated_points = voxfinddydx.parse_lines(request['interpolated_lines'], timebase)
+    results = voxfinddydx.build_results(control_points, interpolated_points, timebase)
+
+    output_format = request.get('format')
+    if output_format is None:
+        return results
+    text = io.StringIO()
+    voxfinddydx.write_results(results, output_format, text)
+    return {'text': text.getvalue()}
+
+def detect_job(request):
+    # Reports only; reducing a chart to its control points stays with the voxdetect CLI
+    report, _, _ = voxdetect.detect_file(request['chart'], request.get('time_signature', '4/4'), request.get('tracks'),
+                                         request.get('ranges'), request.get('tolerance', voxdetect.DEFAULT_TOLERANCE),
+                                         request.get('types') or voxdetect.CANDIDATE_TYPES)
+    return report
+
+JOBS = {
+    'curve': curve_job,
+    'invert': invert_job,
+    'transform': transform_job,
+    'ksh': ksh_job,
+    'dydx': dydx_job,
+    'detect': detect_job,
+}
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # One JSON request per line; a client may send several over the same connection
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                response = {'ok': True, 'result': self.server.dispatch(request)}
+            except SystemExit as e:
+                response = {'ok': False, 'error': f"job exited with status {e.code}"}
+            except Exception as e:
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+class VoxServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, verbose=False):
+        self.socket_path = socket_path
+        self.verbose = verbose
+        self.started = time.monotonic()
+        self.requests = 0
+        self._lock = threading.Lock()
+        remove_stale_socket(socket_path)
+        # The socket accepts file paths to read and write, so only its owner may connect
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def dispatch(self, request):
+        with self._lock:
+            self.requests += 1
+        job = request.get('job')
+        start = time.perf_counter()
+
+        if job == 'ping':
+            result = {'pid': os.getpid(), 'uptime': time.monotonic() - self.started, 'requests': self.requests}
+        elif job == 'shutdown':
+            threading.Thread(target=self.shutdown).start()
+            result = {}
+        elif job in JOBS:
+            result = JOBS[job](request)
+        else:
+            raise VoxError(f"Unknown job: {job}")
+
+        if self.verbose:
+            print(f"{job} {(time.perf_counter() - start) * 1000:.2f} ms", file=sys.stderr)
+        return result
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+def remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(socket_path)
+    else:
+        raise OSError(f"Another voxserver is already listening on {socket_path}")
+    finally:
+        probe.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep numpy/scipy loaded and serve curve, invert, ksh and dydx jobs '
+                                                 'over a Unix socket (see voxclient.py).')
+    parser.add_argument('--socket', default=None, help='Socket path (default: $VOX_SOCKET or a per-user socket).')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every job and its time to stderr.')
+    args = parser.parse_args()
+
+    socket_path = args.socket or default_socket_path()
+    try:
+        server = VoxServer(socket_path, args.verbose)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"voxserver listening on {socket_path}")
+    sys.stdout.flush()
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
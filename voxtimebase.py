@@ -0,0 +1,155 @@
+import bisect
+import os
+
+import numpy as np
+
+from voxerrors import VoxError
+import voxbinary
+
+TICKS_PER_WHOLE_NOTE = 192
+
+def parse_time_signature(time_signature):
+    numerator, denominator = map(int, time_signature.split('/'))
+    return numerator, denominator
+
+def parse_mbt(tick_string):
+    measure, beat, tick = tick_string.split(',')
+    return int(measure), int(beat), int(tick)
+
+def format_mbt(measure, beat, tick):
+    return f"{measure:03},{beat:02},{tick:02}"
+
+class Timebase:
+    def __init__(self, signatures):
+        signatures = sorted(dict((measure, (measure, numerator, denominator))
+                                 for measure, numerator, denominator in signatures).values())
+        if not signatures or signatures[0][0] != 1:
+            signatures.insert(0, (1, 4, 4))
+
+        self.signatures = signatures
+        self.change_measures = []
+        self.beat_ticks = []
+        self.measure_ticks = []
+        self.start_ticks = []
+
+        total_ticks = 0
+        for measure, numerator, denominator in signatures:
+            if self.change_measures:
+                total_ticks += (measure - self.change_measures[-1]) * self.measure_ticks[-1]
+            self.change_measures.append(measure)
+            self.beat_ticks.append(TICKS_PER_WHOLE_NOTE // denominator)
+            self.measure_ticks.append(numerator * TICKS_PER_WHOLE_NOTE // denominator)
+            self.start_ticks.append(total_ticks)
+
+        self._change_measures = np.array(self.change_measures, dtype=np.int64)
+        self._beat_ticks = np.array(self.beat_ticks, dtype=np.int64)
+        self._measure_ticks = np.array(self.measure_ticks, dtype=np.int64)
+        self._start_ticks = np.array(self.start_ticks, dtype=np.int64)
+
+    @classmethod
+    def from_time_signature(cls, time_signature):
+        numerator, denominator = parse_time_signature(time_signature)
+        return cls([(1, numerator, denominator)])
+
+    @classmethod
+    def from_beat_info(cls, lines):
+        signatures = []
+        for line in lines:
+            parts = line.split('\t')
+            if len(parts) < 3 or not parts[0][:1].isdigit():
+                continue
+            measure, _, _ = parse_mbt(parts[0])
+            signatures.append((measure, int(parts[1]), int(parts[2])))
+        return cls(signatures)
+
+    @classmethod
+    def from_vox(cls, file_path):
+        if voxbinary.is_binary(file_path):
+            return cls.from_beat_info(voxbinary.section_lines(file_path, 'BEAT INFO'))
+        lines = []
+        in_beat_info = False
+        with open(file_path, 'r') as file:
+            for line in file:
+                stripped = line.strip()
+                if stripped == '#BEAT INFO':
+                    in_beat_info = True
+                elif stripped == '#END' and in_beat_info:
+                    break
+                elif in_beat_info:
+                    lines.append(stripped)
+        return cls.from_beat_info(lines)
+
+    @classmethod
+    def from_spec(cls, spec):
+        if os.path.isfile(spec):
+            return cls.from_vox(spec)
+        return cls.from_time_signature(spec)
+
+    def _index_of_measure(self, measure):
+        return max(bisect.bisect_right(self.change_measures, measure) - 1, 0)
+
+    def _index_of_tick(self, ticks):
+        return max(bisect.bisect_right(self.start_ticks, ticks) - 1, 0)
+
+    def to_ticks(self, measure, beat, tick):
+        i = self._index_of_measure(measure)
+        return (self.start_ticks[i] + (measure - self.change_measures[i]) * self.measure_ticks[i]
+                + (beat - 1) * self.beat_ticks[i] + tick)
+
+    def from_ticks(self, ticks):
+        i = self._index_of_tick(ticks)
+        measure_offset, remaining_ticks = divmod(ticks - self.start_ticks[i], self.measure_ticks[i])
+        beat, tick = divmod(remaining_ticks, self.beat_ticks[i])
+        return self.change_measures[i] + measure_offset, beat + 1, tick
+
+    def parse(self, tick_string):
+        return self.to_ticks(*parse_mbt(tick_string))
+
+    def format(self, ticks):
+        return format_mbt(*self.from_ticks(ticks))
+
+    def beats_per_measure_at(self, ticks):
+        i = self._index_of_tick(ticks)
+        return self.measure_ticks[i] // self.beat_ticks[i]
+
+    def ticks_per_beat_at(self, ticks):
+        return self.beat_ticks[self._index_of_tick(ticks)]
+
+    def shift(self, ticks, measures=0, beats=0):
+        measure, beat, tick = self.from_ticks(ticks)
+        shifted = self.to_ticks(measure + measures, beat, tick)
+        return shifted + beats * self.ticks_per_beat_at(shifted)
+
+    def to_ticks_array(self, measures, beats, ticks):
+        measures = np.asarray(measures, dtype=np.int64)
+        i = np.maximum(np.searchsorted(self._change_measures, measures, side='right') - 1, 0)
+        return (self._start_ticks[i] + (measures - self._change_measures[i]) * self._measure_ticks[i]
+                + (np.asarray(beats, dtype=np.int64) - 1) * self._beat_ticks[i]
+                + np.asarray(ticks, dtype=np.int64))
+
+    def from_ticks_array(self, ticks):
+        ticks = np.asarray(ticks, dtype=np.int64)
+        i = np.maximum(np.searchsorted(self._start_ticks, ticks, side='right') - 1, 0)
+        measure_offset, remaining_ticks = np.divmod(ticks - self._start_ticks[i], self._measure_ticks[i])
+        beats, sub_ticks = np.divmod(remaining_ticks, self._beat_ticks[i])
+        return self._change_measures[i] + measure_offset, beats + 1, sub_ticks
+
+    def shift_array(self, ticks, measures=0, beats=0):
+        measure, beat, tick = self.from_ticks_array(ticks)
+        shifted = self.to_ticks_array(measure + measures, beat, tick)
+        i = np.maximum(np.searchsorted(self._start_ticks, shifted, side='right') - 1, 0)
+        return shifted + beats * self._beat_ticks[i]
+
+    def parse_column(self, tick_strings):
+        tick_strings = list(tick_strings)
+        if not tick_strings:
+            return np.empty(0, dtype=np.int64)
+        mbt = np.fromstring(','.join(tick_strings), dtype=np.int64, sep=',')
+        if mbt.size != 3 * len(tick_strings):
+            raise VoxError("Malformed measure,beat,tick column.")
+        mbt = mbt.reshape(-1, 3)
+        return self.to_ticks_array(mbt[:, 0], mbt[:, 1], mbt[:, 2])
+
+    def format_column(self, ticks):
+        measures, beats, sub_ticks = self.from_ticks_array(ticks)
+        return [format_mbt(*mbt) for mbt in zip(measures.tolist(), beats.tolist(), sub_ticks.tolist())]
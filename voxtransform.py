@@ -0,0 +1,192 @@
+import argparse
+import itertools
+import sys
+
+import numpy as np
+
+from voxdoc import VoxDocument
+from voxerrors import VoxError
+from voxfiles import output_path_for
+from voxtimebase import Timebase
+import voxprofile
+
+CHUNK_ROWS = 65536
+
+def affine_operation(name, args):
+    # Every value operation except clamp is v -> scale * v + offset
+    if name == 'invert':
+        return -1.0, 1.0
+    if name == 'mirror':
+        pivot = args[0] if args else 0.5
+        return -1.0, 2 * pivot
+    if name == 'scale':
+        factor = args[0]
+        pivot = args[1] if len(args) > 1 else 0.0
+        return factor, pivot * (1 - factor)
+    if name == 'offset':
+        return 1.0, args[0]
+    return None
+
+class Pipeline:
+    VALUE_OPERATIONS = ('invert', 'mirror', 'scale', 'offset', 'clamp')
+
+    def __init__(self, operations):
+        self.operations = [(operation[0], tuple(operation[1:])) for operation in operations]
+
+        # Value operations fuse into clip(scale * v + offset, low, high)
+        self.scale, self.offset = 1.0, 0.0
+        self.low, self.high = -np.inf, np.inf
+        self.shifts = []
+
+        for name, args in self.operations:
+            if name == 'clamp':
+                low, high = (args + (0.0, 1.0)[len(args):])[:2]
+                if low > high:
+                    raise VoxError(f"clamp low {low} is above high {high}.")
+                self.low, self.high = min(max(self.low, low), high), min(max(self.high, low), high)
+            elif name == 'shift':
+                measures, beats = (args + (0, 0)[len(args):])[:2]
+                self.shifts.append((int(measures), int(beats)))
+            elif name in self.VALUE_OPERATIONS:
+                self._compose(*affine_operation(name, args))
+            else:
+                raise VoxError(f"Unknown transform: {name}")
+
+    def _compose(self, scale, offset):
+        if scale == 0:
+            self.scale, self.offset, self.low, self.high = 0.0, offset, -np.inf, np.inf
+            return
+        self.scale, self.offset = scale * self.scale, scale * self.offset + offset
+        low, high = scale * self.low + offset, scale * self.high + offset
+        self.low, self.high = min(low, high), max(low, high)
+
+    def apply_values(self, values):
+        values = np.asarray(values, dtype=float)
+        if self.scale != 1.0 or self.offset != 0.0:
+            values = values * self.scale + self.offset
+        if self.low != -np.inf or self.high != np.inf:
+            values = np.clip(values, self.low, self.high)
+        return values
+
+    def apply_ticks(self, ticks, timebase):
+        ticks = np.asarray(ticks, dtype=np.int64)
+        if not self.shifts:
+            return ticks
+        if len(timebase.signatures) == 1:
+            # Without time signature changes every shift is a constant tick offset, so they add up
+            return ticks + sum(measures * timebase.measure_ticks[0] + beats * timebase.beat_ticks[0]
+                               for measures, beats in self.shifts)
+        for measures, beats in self.shifts:
+            ticks = timebase.shift_array(ticks, measures, beats)
+        return ticks
+
+def transform_lines(lines, timebase, pipeline, chunk_rows=CHUNK_ROWS):
+    lines = iter(lines)
+    while True:
+        chunk = list(itertools.islice(lines, chunk_rows))
+        if not chunk:
+            return
+
+        with voxprofile.stage('parse'):
+            rows = [line.split('\t', 2) for line in chunk if line.strip()]
+            ticks = timebase.parse_column(row[0] for row in rows)
+            values = np.array([float(row[1]) for row in rows], dtype=float)
+
+        with voxprofile.stage('transform'):
+            ticks = pipeline.apply_ticks(ticks, timebase)
+            values = pipeline.apply_values(values)
+
+        with voxprofile.stage('format'):
+            for tick_string, value, row in zip(timebase.format_column(ticks), values.tolist(), rows):
+                yield f"{tick_string}\t{value:.6f}\t" + (row[2] if len(row) > 2 else '')
+
+def process_file(file_path, time_signature, pipeline, output_path='-'):
+    timebase = Timebase.from_spec(time_signature)
+    source = sys.stdin if file_path == '-' else open(file_path, 'r')
+    with source:
+        if output_path == '-':
+            sys.stdout.writelines(transform_lines(source, timebase, pipeline))
+            sys.stdout.flush()
+            return output_path
+        with open(output_path, 'w') as file:
+            file.writelines(transform_lines(source, timebase, pipeline))
+    return output_path
+
+def process_track_range(track, pipeline, start_tick=None, end_tick=None):
+    lo, hi = track.index_range(start_tick, end_tick)
+    with voxprofile.stage('transform'):
+        ticks = pipeline.apply_ticks(track.ticks[lo:hi], track.timebase)
+        values = pipeline.apply_values(track.values[lo:hi])
+    track.replace_rows(lo, hi, ticks, values, track.flags[lo:hi])
+
+def process_chart(file_path, track_name, pipeline, ranges=None, output_path=None):
+    document = VoxDocument.load(file_path)
+    track = document.track(track_name)
+
+    for text in ranges or ['-']:
+        start_tick, end_tick = document.parse_range(text)
+        process_track_range(track, pipeline, start_tick, end_tick)
+
+    output_path = output_path or output_path_for(file_path, '_edited')
+    if output_path == '-':
+        sys.stdout.writelines(document.iter_lines())
+    else:
+        document.save(output_path)
+    return output_path
+
+class AppendOperation(argparse.Action):
+    def __init__(self, option_strings, dest, operation=None, **kwargs):
+        super().__init__(option_strings, dest, **kwargs)
+        self.operation = operation
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        operations = list(getattr(namespace, self.dest) or [])
+        values = values if isinstance(values, list) else [] if values is None else [values]
+        operations.append((self.operation,) + tuple(values))
+        setattr(namespace, self.dest, operations)
+
+def add_operation_arguments(parser):
+    group = parser.add_argument_group('operations', 'Applied in the order given; value and tick operations are fused.')
+    add = lambda *flags, **kwargs: group.add_argument(*flags, dest='operations', action=AppendOperation, **kwargs)
+    add('--invert', operation='invert', nargs=0, help='v -> 1 - v.')
+    add('--mirror', operation='mirror', nargs='?', type=float, metavar='PIVOT',
+        help='Mirror values about PIVOT (default 0.5).')
+    add('--scale', operation='scale', nargs='+', type=float, metavar=('FACTOR', 'PIVOT'),
+        help='Scale values by FACTOR about PIVOT (default 0).')
+    add('--offset', operation='offset', nargs=1, type=float, metavar='AMOUNT', help='Add AMOUNT to every value.')
+    add('--clamp', operation='clamp', nargs=2, type=float, metavar=('LOW', 'HIGH'), help='Clamp values to [LOW, HIGH].')
+    add('--shift', operation='shift', nargs='+', type=int, metavar=('MEASURES', 'BEATS'),
+        help='Move rows by MEASURES and optionally BEATS.')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply a chain of laser transforms in one pass.')
+    parser.add_argument('input_file', help='Snippet of laser rows ("-" for stdin), or a full .vox chart with --track.')
+    parser.add_argument('-t', '--time-signature', default='4/4',
+                        help='Time signature such as "4/4", or a .vox chart to read the beat info from (snippet mode).')
+    parser.add_argument('--track', help='Track of the chart to edit, e.g. 1 or TRACK8.')
+    parser.add_argument('--range', action='append', dest='ranges', metavar='START-END',
+                        help='Tick range to transform, e.g. 005,01,00-008,01,00. Repeat for several edits.')
+    parser.add_argument('-o', '--output',
+                        help='Output path, "-" for stdout (default: stdout for snippets, <input>_edited.vox for charts).')
+    add_operation_arguments(parser)
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+
+    if not args.operations:
+        parser.error("no operations given")
+    for name, *values in args.operations:
+        if (name == 'scale' or name == 'shift') and len(values) > 2:
+            parser.error(f"--{name} takes at most two values")
+
+    try:
+        pipeline = Pipeline(args.operations)
+        if args.track:
+            output_path = process_chart(args.input_file, args.track, pipeline, args.ranges, args.output)
+            if output_path != '-':
+                print(f"Chart saved as: {output_path}")
+        else:
+            process_file(args.input_file, args.time_signature, pipeline, args.output or '-')
+    except VoxError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,213 @@
+import argparse
+import functools
+import json
+import os
+import sys
+
+import numpy as np
+
+import vox10to12
+from voxdoc import LASER_TRACKS, VoxDocument
+from voxfiles import expand_paths, map_batch, output_path_for
+import voxprofile
+
+# Values are written with six decimals
+PRECISION = 1e-6
+
+# Where each tool writes the output of a chart
+OUTPUT_SUFFIXES = {
+    'convert': '_processed',
+    'curve': '_edited',
+    'ksh': '_edited',
+}
+
+def check(name, failures, ticks, timebase):
+    # failures is a boolean mask over ticks; the first failing row is reported by position
+    failures = np.asarray(failures, dtype=bool)
+    count = int(failures.sum())
+    result = {'check': name, 'ok': count == 0, 'failures': count}
+    if count:
+        first = int(np.flatnonzero(failures)[0])
+        result['first'] = timebase.format(int(ticks[min(first, len(ticks) - 1)])) if len(ticks) else None
+    return result
+
+def count_check(name, expected, actual):
+    return {'check': name, 'ok': expected == actual, 'failures': int(expected != actual), 'expected': expected,
+            'actual': actual}
+
+def equal_check(name, expected, actual):
+    return {'check': name, 'ok': expected == actual, 'failures': int(expected != actual)}
+
+def order_check(name, track):
+    return check(name, np.diff(track.ticks) < 0, track.ticks[1:], track.timebase)
+
+def expected_laser_values(source_values):
+    # Computed here rather than taken from vox10to12, so that a wrong converter table fails the check: positions
+    # 1-62 are mirrored (129 - p), every position is snapped to 1/32 of the 0-127 range, and 1-62 are mirrored back
+    positions = source_values.astype(np.int64)
+    mirrored = (positions > 0) & (positions < 63)
+    snapped = np.round(np.where(mirrored, 129 - positions, positions) * 32 / 127) / 32
+    return np.where(mirrored, 1 - snapped, snapped)
+
+def expected_laser_flags(source_flags):
+    # Every converted row gains two '0' flag columns after its own
+    lengths = (source_flags != '').sum(axis=1)
+    expected = np.full((len(source_flags), source_flags.shape[1] + 2), '', dtype=object)
+    expected[:, :source_flags.shape[1]] = source_flags
+    rows = np.arange(len(source_flags))
+    expected[rows, lengths] = '0'
+    expected[rows, lengths + 1] = '0'
+    return expected
+
+def padded(flags, width):
+    result = np.full((len(flags), width), '', dtype=object)
+    result[:, :flags.shape[1]] = flags
+    return result
+
+def validate_conversion(source, output):
+    checks = []
+    for name, section in source.sections.items():
+        if name not in output.sections:
+            checks.append({'check': f"{name} present", 'ok': False, 'failures': 1})
+            continue
+        if name in LASER_TRACKS:
+            continue
+        expected = section.lines
+        if name == 'FORMAT VERSION':
+            expected = list(vox10to12.convert_lines([section.header] + section.lines))[1:]
+        checks.append(equal_check(f"{name} unchanged", expected, output.sections[name].lines))
+
+    for name in LASER_TRACKS:
+        if name not in source.sections or name not in output.sections:
+            continue
+        source_track, output_track = source.track(name), output.track(name)
+        checks.append(count_check(f"{name} rows", len(source_track), len(output_track)))
+        checks.append(order_check(f"{name} monotone ticks", output_track))
+        if len(source_track) != len(output_track):
+            continue
+
+        ticks = source_track.ticks
+        checks.append(check(f"{name} ticks", source_track.ticks != output_track.ticks, ticks, source.timebase))
+        value_errors = np.abs(expected_laser_values(source_track.values) - output_track.values) > PRECISION / 2
+        checks.append(check(f"{name} values", value_errors, ticks, source.timebase))
+        expected_flags = expected_laser_flags(source_track.flags)
+        width = max(expected_flags.shape[1], output_track.flags.shape[1])
+        flag_errors = (padded(expected_flags, width) != padded(output_track.flags, width)).any(axis=1)
+        checks.append(check(f"{name} flags", flag_errors, ticks, source.timebase))
+    return checks
+
+def required_rows(track, mode):
+    # vox12curve keeps every control point; vox12tokshcurve resamples but keeps laser ends and both rows of a slam
+    if mode == 'curve' or not len(track):
+        return np.arange(len(track))
+    rows = np.zeros(len(track), dtype=bool)
+    for lo, hi in track.laser_ranges():
+        rows[[lo, hi - 1]] = True
+    slams = np.flatnonzero(track.ticks[1:] == track.ticks[:-1])
+    rows[slams] = rows[slams + 1] = True
+    return np.flatnonzero(rows)
+
+def endpoint_misses(source_track, output_track, rows):
+    # A required row is hit when an output row at the same tick has the same value; slams give two candidates
+    ticks = source_track.ticks[rows]
+    values = source_track.values[rows]
+    left = np.searchsorted(output_track.ticks, ticks, side='left')
+    right = np.searchsorted(output_track.ticks, ticks, side='right')
+    found = left < right
+    last = len(output_track) - 1
+    first_error = np.abs(output_track.values[np.minimum(left, last)] - values) if len(output_track) else np.inf
+    last_error = np.abs(output_track.values[np.clip(right - 1, 0, last)] - values) if len(output_track) else np.inf
+    return ~found | (np.minimum(first_error, last_error) > PRECISION)
+
+def validate_curves(source, output, mode):
+    checks = []
+    for name in LASER_TRACKS:
+        if name not in source.sections:
+            continue
+        if name not in output.sections:
+            checks.append({'check': f"{name} present", 'ok': False, 'failures': 1})
+            continue
+        source_track, output_track = source.track(name), output.track(name)
+        checks.append(order_check(f"{name} monotone ticks", output_track))
+        # Both tools generate plain nodes between control points, so every laser keeps its own end row
+        checks.append(count_check(f"{name} lasers", len(source_track.laser_ranges()), len(output_track.laser_ranges())))
+        rows = required_rows(source_track, mode)
+        checks.append(check(f"{name} endpoints", endpoint_misses(source_track, output_track, rows),
+                            source_track.ticks[rows], source.timebase))
+    return checks
+
+def validate_pair(source_path, output_path, mode):
+    with voxprofile.stage('read'):
+        source = VoxDocument.load(source_path)
+        output = VoxDocument.load(output_path)
+    with voxprofile.stage('validate'):
+        if mode == 'convert':
+            return validate_conversion(source, output)
+        return validate_curves(source, output, mode)
+
+def validate_one(source_path, mode, suffix=None):
+    output_path = output_path_for(source_path, suffix or OUTPUT_SUFFIXES[mode])
+    report = {'source': source_path, 'output': output_path, 'mode': mode}
+    try:
+        report['checks'] = validate_pair(source_path, output_path, mode)
+        report['ok'] = all(result['ok'] for result in report['checks'])
+    except Exception as e:
+        report['checks'] = []
+        report['ok'] = False
+        report['error'] = f"{type(e).__name__}: {e}"
+    return report
+
+def validate_batch(source_paths, mode, suffix=None, workers=None):
+    return map_batch(functools.partial(validate_one, mode=mode, suffix=suffix), source_paths, workers)
+
+def source_paths(patterns, mode, suffix=None):
+    # Outputs found next to their sources are not sources themselves
+    output_suffix = suffix or OUTPUT_SUFFIXES[mode]
+    return [path for path in expand_paths(patterns) if not os.path.splitext(path)[0].endswith(output_suffix)]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check converted, curved or ksh charts against their sources.')
+    parser.add_argument('mode', choices=sorted(OUTPUT_SUFFIXES),
+                        help='convert: vox10to12 output; curve: vox12curve output; ksh: vox12tokshcurve output.')
+    parser.add_argument('paths', nargs='+', help='Source charts, directories or glob patterns.')
+    parser.add_argument('--suffix', help='Suffix added before the extension of the output name (default: _processed '
+                                         'for convert, _edited otherwise).')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: CPU count).')
+    parser.add_argument('--json', metavar='FILE', help='Write the full report as JSON ("-" for stdout).')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only print failing charts and the summary.')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+
+    paths = source_paths(args.paths, args.mode, args.suffix)
+    if not paths:
+        print("Error: No .vox files found.")
+        sys.exit(1)
+
+    reports = []
+    failed = 0
+    for report in validate_batch(paths, args.mode, args.suffix, args.workers):
+        reports.append(report)
+        if report['ok']:
+            if not args.quiet and args.json != '-':
+                print(f"OK      {report['source']}")
+            continue
+        failed += 1
+        if 'error' in report:
+            reason = report['error']
+        else:
+            reason = ', '.join(f"{result['check']} ({result['failures']}"
+                               + (f" from {result['first']})" if result.get('first') else ')')
+                               for result in report['checks'] if not result['ok'])
+        print(f"FAILED  {report['source']}: {reason}", file=sys.stderr if args.json == '-' else sys.stdout)
+
+    if args.json == '-':
+        json.dump(reports, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as file:
+            json.dump(reports, file, indent=2)
+    if args.json != '-':
+        print(f"{len(paths) - failed} valid, {failed} invalid")
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import vox10to12
+import vox12curve
+import vox12tokshcurve
+from voxcache import MemoCache
+from voxdoc import LASER_TRACKS, Section, VoxDocument, track_section_name
+from voxerrors import VoxError
+from voxfiles import output_path_for
+import voxprofile
+
+# Outputs of the watched tools, which are never treated as inputs
+DERIVED_SUFFIXES = ('_processed.vox', '_edited.vox', '_ksh.vox')
+
+DEFAULT_INTERVAL = 0.5
+
+def is_v10(document):
+    section = document.sections.get('FORMAT VERSION')
+    return section is not None and any(line.strip() == '10' for line in section.lines)
+
+def convert_sections(document, memo):
+    # vox10to12 rewrites sections independently, so only sections whose text changed are converted again
+    for item in document.items:
+        if not isinstance(item, Section):
+            continue
+        key = (item.header, tuple(item.lines))
+        lines = memo.get(key)
+        if lines is None:
+            lines = list(vox10to12.convert_lines([item.header] + item.lines))[1:]
+            memo.put(key, lines)
+        item.lines = list(lines)
+
+class ChartState:
+    def __init__(self):
+        self.stamp = None
+        self.digest = None
+        self.sections = MemoCache()
+        self.segments = MemoCache()
+        self.lasers = MemoCache()
+
+    def memos(self):
+        return self.sections, self.segments, self.lasers
+
+class Watcher:
+    def __init__(self, directory, interpolation_type='keep', segments=None, track_names=None, step=3, tolerance=None,
+                 ksh=False, ksh_tolerance=None):
+        self.directory = directory
+        self.interpolation_type = interpolation_type
+        self.segments = segments
+        self.track_names = track_names
+        self.step = step
+        self.tolerance = tolerance
+        self.ksh = ksh
+        self.ksh_tolerance = ksh_tolerance
+        self.charts = {}
+        self.spec_stamp = None
+
+    def chart_paths(self):
+        paths = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.vox') and not name.endswith(DERIVED_SUFFIXES):
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    def spec_changed(self):
+        # A --segments JSON file is watched too; editing it rebuilds every chart, reusing unchanged segments
+        if self.segments is None or not os.path.isfile(self.segments):
+            return False
+        stat = os.stat(self.segments)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        changed = self.spec_stamp is not None and stamp != self.spec_stamp
+        self.spec_stamp = stamp
+        return changed
+
+    def poll(self):
+        rebuild_all = self.spec_changed()
+        paths = self.chart_paths()
+        for file_path in set(self.charts) - set(paths):
+            del self.charts[file_path]
+
+        results = []
+        for file_path in paths:
+            state = self.charts.setdefault(file_path, ChartState())
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp == state.stamp and not rebuild_all:
+                continue
+            state.stamp = stamp
+
+            try:
+                with open(file_path, 'r') as file:
+                    lines = file.readlines()
+            except OSError:
+                continue
+            digest = hashlib.sha256(''.join(lines).encode()).hexdigest()
+            if digest == state.digest and not rebuild_all:
+                continue
+            state.digest = digest
+            results.append(self.process(file_path, lines, state))
+        return results
+
+    def process(self, file_path, lines, state):
+        start = time.perf_counter()
+        for memo in state.memos():
+            memo.reset_stats()
+
+        try:
+            outputs = self.build(file_path, lines, state)
+        except (VoxError, ValueError, KeyError, IndexError, OSError) as e:
+            return file_path, None, f"{type(e).__name__}: {e}"
+
+        # Everything this build did not use belongs to an older version of the chart
+        for memo in state.memos():
+            memo.prune()
+        reused = sum(memo.hits for memo in state.memos())
+        computed = sum(memo.misses for memo in state.memos())
+        return file_path, {'outputs': outputs, 'reused': reused, 'computed': computed,
+                           'seconds': time.perf_counter() - start}, None
+
+    def build(self, file_path, lines, state):
+        document = VoxDocument.parse(lines)
+        outputs = []
+
+        if is_v10(document):
+            with voxprofile.stage('convert'):
+                convert_sections(document, state.sections)
+            output_path = output_path_for(file_path, '_processed')
+            document.save(output_path)
+            outputs.append(output_path)
+
+        if self.segments is None and self.interpolation_type == 'keep' and not self.ksh:
+            return outputs
+
+        names = self.track_names or [name for name in LASER_TRACKS if name in document.sections]
+        tracks = [document.track(name) for name in names]
+        if self.segments is not None or self.interpolation_type != 'keep':
+            segment_spec = vox12curve.parse_segment_spec(self.segments) if self.segments else ([], {}, None)
+            for track in tracks:
+                vox12curve.process_track_segments(track, segment_spec, self.interpolation_type, step=self.step,
+                                                  tolerance=self.tolerance, memo=state.segments)
+            output_path = output_path_for(file_path, '_edited')
+            document.save(output_path)
+            outputs.append(output_path)
+
+        if self.ksh:
+            for track in tracks:
+                vox12tokshcurve.process_track_range(track, tolerance=self.ksh_tolerance, memo=state.lasers)
+            output_path = output_path_for(file_path, '_ksh')
+            document.save(output_path)
+            outputs.append(output_path)
+
+        return outputs
+
+def report(results):
+    for file_path, result, error in results:
+        if error is not None:
+            print(f"FAILED  {file_path}: {error}", flush=True)
+            continue
+        print(f"OK      {file_path} -> {', '.join(result['outputs']) or 'nothing to do'} "
+              f"({result['computed']} recomputed, {result['reused']} reused, {result['seconds'] * 1000:.1f} ms)",
+              flush=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Watch a chart directory and rebuild converted, curved and ksh charts as they are edited. '
+                    'Only the sections, segments and lasers that changed are computed again.')
+    parser.add_argument('directory', help='Directory of .vox charts to watch.')
+    parser.add_argument('interpolation_type', nargs='?', default='keep', type=str.lower,
+                        help='Type of the segments --segments does not cover (default: keep them as they are).')
+    parser.add_argument('--segments', metavar='SPEC', help='Segment types as in vox12curve --segments. A JSON file '
+                                                           'is watched as well.')
+    parser.add_argument('--track', action='append', dest='tracks', help='Track to curve (default: both lasers).')
+    parser.add_argument('--step', type=int, default=3, help='Tick step between generated points.')
+    parser.add_argument('--tolerance', type=float, metavar='VALUE', help='Adaptive curve output, as in vox12curve.')
+    parser.add_argument('--ksh', action='store_true', help='Also write <chart>_ksh.vox resampled for ksh.')
+    parser.add_argument('--ksh-tolerance', type=float, metavar='VALUE', help='Adaptive ksh output.')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f'Seconds between directory scans (default: {DEFAULT_INTERVAL}).')
+    parser.add_argument('--once', action='store_true', help='Build every chart once and exit.')
+    voxprofile.add_arguments(parser)
+    args = parser.parse_args()
+    voxprofile.configure(args)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"not a directory: {args.directory}")
+    try:
+        vox12curve.check_interpolation_type(args.interpolation_type, allow_keep=True)
+        if args.segments:
+            vox12curve.parse_segment_spec(args.segments)
+    except VoxError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    tracks = [track_section_name(track) for track in args.tracks] if args.tracks else None
+    watcher = Watcher(args.directory, args.interpolation_type, args.segments, tracks, args.step, args.tolerance,
+                      args.ksh, args.ksh_tolerance)
+
+    report(watcher.poll())
+    if args.once:
+        sys.exit(0)
+
+    print(f"Watching {args.directory} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(args.interval)
+            report(watcher.poll())
+    except KeyboardInterrupt:
+        pass